@@ -1,6 +1,8 @@
 import os
 import json
 import logging
+import time
+from collections import deque
 from typing import Optional
 
 import cudf
@@ -20,6 +22,15 @@ app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], all
 
 GRAPH_CACHE = {}
 
+SIMILARITY_THRESHOLD = 0.2
+LOUVAIN_MODULARITY_TOLERANCE = float(os.environ.get("LOUVAIN_MODULARITY_TOLERANCE", "0.02"))
+LOUVAIN_MAX_SWEEPS = int(os.environ.get("LOUVAIN_MAX_SWEEPS", "3"))
+GRAPH_SNAPSHOT_HISTORY = int(os.environ.get("GRAPH_SNAPSHOT_HISTORY", "5"))
+
+GRAPH_SNAPSHOTS = deque(maxlen=GRAPH_SNAPSHOT_HISTORY)
+SAMPLE_KEYS = {}
+SAMPLE_KEY_IDS = []
+
 
 def get_snowflake_connection():
     import snowflake.connector
@@ -134,6 +145,129 @@ def run_louvain(G):
     return parts.to_pandas(), modularity
 
 
+def _csr_adjacency(n_nodes, src, dst, weight):
+    both_src = np.concatenate([src, dst])
+    both_dst = np.concatenate([dst, src])
+    both_w = np.concatenate([weight, weight])
+    order = np.argsort(both_src, kind="stable")
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(both_src, minlength=n_nodes), out=indptr[1:])
+    return indptr, both_dst[order], both_w[order]
+
+
+def weighted_degrees(n_nodes, src, dst, weight):
+    return (np.bincount(src, weights=weight, minlength=n_nodes)
+            + np.bincount(dst, weights=weight, minlength=n_nodes))
+
+
+def compute_modularity(src, dst, weight, partition):
+    """Newman modularity of `partition` (-1 = not in graph) over an undirected edge list."""
+    m = float(weight.sum())
+    if m <= 0:
+        return 0.0
+    n_comm = int(partition.max()) + 1
+    degrees = weighted_degrees(len(partition), src, dst, weight)
+    internal = (partition[src] == partition[dst]) & (partition[src] >= 0)
+    internal_w = np.bincount(partition[src][internal], weights=weight[internal], minlength=n_comm)
+    assigned = partition >= 0
+    totals = np.bincount(partition[assigned], weights=degrees[assigned], minlength=n_comm)
+    return float(internal_w.sum() / m - ((totals / (2 * m)) ** 2).sum())
+
+
+def incremental_louvain(n_nodes, src, dst, weight, partition, new_vertices, next_id, max_sweeps=LOUVAIN_MAX_SWEEPS):
+    """Place `new_vertices` into existing communities by local modularity gain.
+
+    Existing assignments are kept; new vertices, and connected vertices that
+    have no community yet (-1), join the neighbouring community
+    with the best gain (or a fresh id when none is positive), then up to
+    `max_sweeps` local-move sweeps run over the new vertices and their
+    neighbours only. Returns (partition, next_id, moves).
+    """
+    partition = partition.copy()
+    m = float(weight.sum())
+    if m <= 0:
+        return partition, next_id, 0
+
+    indptr, nbrs, nbr_w = _csr_adjacency(n_nodes, src, dst, weight)
+    degrees = weighted_degrees(n_nodes, src, dst, weight)
+    assigned = partition >= 0
+    comm_ids, inv = np.unique(partition[assigned], return_inverse=True)
+    totals = dict(zip(comm_ids.tolist(), np.bincount(inv, weights=degrees[assigned]).tolist()))
+
+    def move(v):
+        nonlocal next_id
+        own = int(partition[v])
+        k = degrees[v]
+        if own >= 0:
+            totals[own] -= k
+        lo, hi = indptr[v], indptr[v + 1]
+        comms = partition[nbrs[lo:hi]]
+        linked = comms >= 0
+        best, best_gain = own, 0.0
+        if linked.any():
+            uniq, idx = np.unique(comms[linked], return_inverse=True)
+            k_in = np.bincount(idx, weights=nbr_w[lo:hi][linked])
+            gains = k_in / m - k * np.array([totals[c] for c in uniq.tolist()]) / (2 * m * m)
+            if own >= 0:
+                own_pos = np.flatnonzero(uniq == own)
+                best_gain = float(gains[own_pos[0]]) if len(own_pos) else -k * totals[own] / (2 * m * m)
+            top = int(np.argmax(gains))
+            if gains[top] > best_gain + 1e-12:
+                best, best_gain = int(uniq[top]), float(gains[top])
+        if best < 0:
+            best = next_id
+            next_id += 1
+        partition[v] = best
+        totals[best] = totals.get(best, 0.0) + k
+        return best != own
+
+    unplaced = np.flatnonzero((partition < 0) & (degrees > 0)).tolist()
+    new_vertices = sorted({int(v) for v in new_vertices if degrees[v] > 0}.union(unplaced))
+    moves = sum(move(v) for v in new_vertices)
+
+    affected = set(new_vertices)
+    for v in new_vertices:
+        affected.update(nbrs[indptr[v]:indptr[v + 1]].tolist())
+    affected = sorted(affected)
+    for _ in range(max_sweeps):
+        moved = sum(move(v) for v in affected)
+        moves += moved
+        if not moved:
+            break
+    return partition, next_id, moves
+
+
+def stabilize_community_ids(partition, previous, next_id):
+    """Relabel a fresh partition so communities keep the id of the previous
+    community they overlap most; unmatched communities get ids from `next_id`.
+
+    `previous` holds the prior community per vertex (-1 when unknown).
+    """
+    valid = partition >= 0
+    overlap = valid & (previous >= 0)
+    mapping = {}
+    if overlap.any():
+        pairs, counts = np.unique(np.stack([partition[overlap], previous[overlap]], axis=1),
+                                  axis=0, return_counts=True)
+        used = set()
+        for new_c, old_c in pairs[np.argsort(-counts, kind="stable")].tolist():
+            if new_c not in mapping and old_c not in used:
+                mapping[new_c] = old_c
+                used.add(old_c)
+    for c in np.unique(partition[valid]).tolist():
+        if c not in mapping:
+            mapping[c] = next_id
+            next_id += 1
+
+    relabeled = partition.copy()
+    if mapping:
+        keys = np.fromiter(mapping.keys(), dtype=np.int64)
+        vals = np.fromiter(mapping.values(), dtype=np.int64)
+        order = np.argsort(keys)
+        relabeled[valid] = vals[order][np.searchsorted(keys[order], partition[valid])]
+    return relabeled, next_id
+
+
 def run_pagerank(G, top_n=20):
     logger.info("Running PageRank...")
     pr = cugraph.pagerank(G)
@@ -165,19 +299,148 @@ def compute_layout(G, edge_df, n_nodes):
     return {"x": xs.tolist(), "y": ys.tolist()}
 
 
+def _patient_meta(pdf):
+    return pdf.drop_duplicates(subset=['SAMPLE_ID'])[[
+        'SAMPLE_ID', 'PATIENT_ID', 'PATIENT_NAME', 'POPULATION',
+        'SUPERPOPULATION', 'RACE', 'ETHNICITY', 'CITY', 'STATE'
+    ]].set_index('SAMPLE_ID')
+
+
+def _edge_arrays(edge_df):
+    edf = edge_df.to_pandas()
+    return (edf['src'].to_numpy(dtype=np.int64),
+            edf['dst'].to_numpy(dtype=np.int64),
+            edf['weight'].to_numpy(dtype=np.float64))
+
+
+def _partition_array(louvain, n_nodes):
+    partition = np.full(n_nodes, -1, dtype=np.int64)
+    partition[louvain['vertex'].to_numpy(dtype=np.int64)] = louvain['partition'].to_numpy(dtype=np.int64)
+    return partition
+
+
+def _partition_frame(partition):
+    in_graph = np.flatnonzero(partition >= 0)
+    return pd.DataFrame({"vertex": in_graph.astype(np.int32), "partition": partition[in_graph].astype(np.int32)})
+
+
+def _sample_keys(samples):
+    """Stable integer key per sample id, shared across graph versions."""
+    keys = np.empty(len(samples), dtype=np.int64)
+    for i, s in enumerate(samples):
+        key = SAMPLE_KEYS.get(s)
+        if key is None:
+            key = SAMPLE_KEYS[s] = len(SAMPLE_KEY_IDS)
+            SAMPLE_KEY_IDS.append(s)
+        keys[i] = key
+    return keys
+
+
+def record_snapshot():
+    """Append the cached graph to the version history as sorted edge keys."""
+    samples = GRAPH_CACHE['samples']
+    sample_keys = _sample_keys(samples)
+    src, dst, weight = _edge_arrays(GRAPH_CACHE['edge_df'])
+    a, b = sample_keys[src], sample_keys[dst]
+    edge_keys = (np.minimum(a, b) << 32) | np.maximum(a, b)
+    order = np.argsort(edge_keys)
+
+    partition = np.full(len(SAMPLE_KEY_IDS), -1, dtype=np.int64)
+    partition[sample_keys] = _partition_array(GRAPH_CACHE['louvain'], len(samples))
+    present = np.zeros(len(SAMPLE_KEY_IDS), dtype=bool)
+    present[sample_keys] = True
+
+    version = GRAPH_SNAPSHOTS[-1]['version'] + 1 if GRAPH_SNAPSHOTS else 1
+    GRAPH_SNAPSHOTS.append({
+        "version": version,
+        "created_at": time.time(),
+        "edge_keys": edge_keys[order],
+        "edge_weights": weight[order],
+        "partition": partition,
+        "present": present,
+        "modularity": float(GRAPH_CACHE['modularity']),
+    })
+    GRAPH_CACHE['version'] = version
+    return version
+
+
+def _merge_sorted_keys(old_keys, new_keys, old_w, new_w):
+    """Diff two sorted unique key arrays in one merge pass.
+
+    A stable sort over two concatenated sorted runs is a linear merge (timsort),
+    and keeps the old entry ahead of the new one for keys present in both.
+    """
+    keys = np.concatenate([old_keys, new_keys])
+    weights = np.concatenate([old_w, new_w])
+    from_new = np.concatenate([np.zeros(len(old_keys), dtype=bool), np.ones(len(new_keys), dtype=bool)])
+    order = np.argsort(keys, kind="stable")
+    keys, weights, from_new = keys[order], weights[order], from_new[order]
+
+    pair = keys[1:] == keys[:-1]
+    shared = np.zeros(len(keys), dtype=bool)
+    shared[1:] |= pair
+    shared[:-1] |= pair
+    reweighted = np.abs(weights[1:][pair] - weights[:-1][pair]) > 1e-6
+    return {
+        "added": (keys[~shared & from_new], weights[~shared & from_new]),
+        "removed": (keys[~shared & ~from_new], weights[~shared & ~from_new]),
+        "unchanged": int(pair.sum() - reweighted.sum()),
+        "reweighted": int(reweighted.sum()),
+    }
+
+
+def _decode_edges(keys, weights, limit):
+    return [[SAMPLE_KEY_IDS[int(k) >> 32], SAMPLE_KEY_IDS[int(k) & 0xFFFFFFFF], round(float(w), 4)]
+            for k, w in zip(keys[:limit], weights[:limit])]
+
+
+def diff_snapshots(old, new, limit=100):
+    """Compact change report between two graph snapshots."""
+    edges = _merge_sorted_keys(old['edge_keys'], new['edge_keys'], old['edge_weights'], new['edge_weights'])
+
+    n_keys = max(len(old['partition']), len(new['partition']))
+    old_part, new_part = (np.pad(snap['partition'], (0, n_keys - len(snap['partition'])), constant_values=-1)
+                          for snap in (old, new))
+    old_present, new_present = (np.pad(snap['present'], (0, n_keys - len(snap['present'])))
+                                for snap in (old, new))
+
+    moved = np.flatnonzero((old_part >= 0) & (new_part >= 0) & (old_part != new_part))
+    added = np.flatnonzero(new_present & ~old_present)
+    removed = np.flatnonzero(old_present & ~new_present)
+
+    return {
+        "from_version": old['version'],
+        "to_version": new['version'],
+        "modularity": {
+            "from": round(old['modularity'], 4),
+            "to": round(new['modularity'], 4),
+            "delta": round(new['modularity'] - old['modularity'], 4),
+        },
+        "patients": {"added": len(added), "removed": len(removed), "moved_community": len(moved)},
+        "edges": {
+            "added": len(edges['added'][0]),
+            "removed": len(edges['removed'][0]),
+            "reweighted": edges['reweighted'],
+            "unchanged": edges['unchanged'],
+        },
+        "community_moves": [{"sample_id": SAMPLE_KEY_IDS[k], "from": int(old_part[k]), "to": int(new_part[k])}
+                            for k in moved[:limit].tolist()],
+        "added_patients": [SAMPLE_KEY_IDS[k] for k in added[:limit].tolist()],
+        "removed_patients": [SAMPLE_KEY_IDS[k] for k in removed[:limit].tolist()],
+        "added_edges": _decode_edges(*edges['added'], limit),
+        "removed_edges": _decode_edges(*edges['removed'], limit),
+    }
+
+
 @app.on_event("startup")
 async def startup():
     logger.info("Starting cuGraph Variant Similarity service...")
     try:
         pdf = load_pgx_data()
         matrix, samples, variants, sample_idx = build_variant_vectors(pdf)
+        patient_meta = _patient_meta(pdf)
 
-        patient_meta = pdf.drop_duplicates(subset=['SAMPLE_ID'])[[
-            'SAMPLE_ID', 'PATIENT_ID', 'PATIENT_NAME', 'POPULATION',
-            'SUPERPOPULATION', 'RACE', 'ETHNICITY', 'CITY', 'STATE'
-        ]].set_index('SAMPLE_ID')
-
-        G, edge_df = build_similarity_graph(matrix, samples, threshold=0.2)
+        G, edge_df = build_similarity_graph(matrix, samples, threshold=SIMILARITY_THRESHOLD)
         louvain_parts, modularity = run_louvain(G)
         pagerank_df = run_pagerank(G, top_n=50)
 
@@ -191,15 +454,87 @@ async def startup():
         GRAPH_CACHE['edge_df'] = edge_df
         GRAPH_CACHE['louvain'] = louvain_parts
         GRAPH_CACHE['modularity'] = modularity
+        GRAPH_CACHE['baseline_modularity'] = modularity
+        GRAPH_CACHE['next_community_id'] = int(louvain_parts['partition'].max()) + 1 if len(louvain_parts) else 0
         GRAPH_CACHE['pagerank'] = pagerank_df
 
         layout_pos = compute_layout(G, edge_df, len(samples))
         GRAPH_CACHE['layout'] = layout_pos
+        record_snapshot()
         logger.info("Startup complete — graph cached.")
     except Exception as e:
         logger.error(f"Startup failed: {e}", exc_info=True)
 
 
+def refresh_graph(pdf, max_sweeps=LOUVAIN_MAX_SWEEPS, tolerance=LOUVAIN_MODULARITY_TOLERANCE, force_full=False):
+    """Rebuild the similarity graph from `pdf`, keeping community ids stable.
+
+    Samples already in the cache keep their community; new samples are placed
+    incrementally. Full Louvain runs only when modularity drifts more than
+    `tolerance` from the last full run (or when `force_full` is set), and its
+    communities are relabeled to match the previous ids.
+    """
+    prev_samples = GRAPH_CACHE['samples']
+    prev_partition = _partition_array(GRAPH_CACHE['louvain'], len(prev_samples))
+    prev_by_sample = dict(zip(prev_samples, prev_partition.tolist()))
+    next_id = GRAPH_CACHE['next_community_id']
+
+    matrix, samples, variants, sample_idx = build_variant_vectors(pdf)
+    G, edge_df = build_similarity_graph(matrix, samples, threshold=SIMILARITY_THRESHOLD)
+    src, dst, weight = _edge_arrays(edge_df)
+    n = len(samples)
+
+    previous = np.array([prev_by_sample.get(s, -1) for s in samples], dtype=np.int64)
+    new_vertices = [i for i, s in enumerate(samples) if s not in prev_by_sample]
+    partition, next_id, moves = incremental_louvain(
+        n, src, dst, weight, previous, new_vertices, next_id, max_sweeps=max_sweeps)
+    degrees = weighted_degrees(n, src, dst, weight)
+    partition[degrees <= 0] = -1
+    modularity = compute_modularity(src, dst, weight, partition)
+    baseline = GRAPH_CACHE['baseline_modularity']
+    drift = abs(modularity - baseline)
+
+    mode = "incremental"
+    if force_full or drift > tolerance:
+        logger.info(f"Modularity drift {drift:.4f} exceeds {tolerance} — running full Louvain")
+        parts, modularity = run_louvain(G)
+        partition, next_id = stabilize_community_ids(_partition_array(parts, n), previous, next_id)
+        baseline = modularity
+        mode = "full"
+    else:
+        logger.info(f"Incremental Louvain: {len(new_vertices)} new samples, {moves} moves, "
+                    f"modularity {modularity:.4f} (drift {drift:.4f})")
+
+    GRAPH_CACHE['pdf'] = pdf
+    GRAPH_CACHE['matrix'] = matrix
+    GRAPH_CACHE['samples'] = samples
+    GRAPH_CACHE['variants'] = variants
+    GRAPH_CACHE['sample_idx'] = sample_idx
+    GRAPH_CACHE['patient_meta'] = _patient_meta(pdf)
+    GRAPH_CACHE['G'] = G
+    GRAPH_CACHE['edge_df'] = edge_df
+    GRAPH_CACHE['louvain'] = _partition_frame(partition)
+    GRAPH_CACHE['modularity'] = modularity
+    GRAPH_CACHE['baseline_modularity'] = baseline
+    GRAPH_CACHE['next_community_id'] = next_id
+    GRAPH_CACHE['pagerank'] = run_pagerank(G, top_n=50)
+    GRAPH_CACHE['layout'] = compute_layout(G, edge_df, n)
+    version = record_snapshot()
+
+    return {
+        "version": version,
+        "mode": mode,
+        "patients": n,
+        "new_patients": len(new_vertices),
+        "removed_patients": len(set(prev_samples) - set(samples)),
+        "moves": int(moves),
+        "modularity": round(modularity, 4),
+        "baseline_modularity": round(baseline, 4),
+        "modularity_drift": round(drift, 4),
+        "communities": int(np.unique(partition[partition >= 0]).size),
+    }
+
+
 @app.api_route("/health", methods=["GET", "POST"])
 async def health():
     ready = 'G' in GRAPH_CACHE
@@ -211,6 +546,43 @@ async def health():
     }
 
 
+@app.post("/api/graph/refresh")
+async def graph_refresh(max_sweeps: int = Query(default=LOUVAIN_MAX_SWEEPS),
+                        tolerance: float = Query(default=LOUVAIN_MODULARITY_TOLERANCE),
+                        force_full: bool = Query(default=False)):
+    if 'G' not in GRAPH_CACHE:
+        raise HTTPException(503, "Graph not ready")
+    pdf = load_pgx_data()
+    return refresh_graph(pdf, max_sweeps=max_sweeps, tolerance=tolerance, force_full=force_full)
+
+
+@app.api_route("/api/graph/versions", methods=["GET", "POST"])
+async def graph_versions():
+    return [{
+        "version": snap['version'],
+        "created_at": snap['created_at'],
+        "patients": int(snap['present'].sum()),
+        "edges": len(snap['edge_keys']),
+        "communities": int(np.unique(snap['partition'][snap['partition'] >= 0]).size),
+        "modularity": round(snap['modularity'], 4),
+    } for snap in GRAPH_SNAPSHOTS]
+
+
+@app.api_route("/api/graph/diff", methods=["GET", "POST"])
+async def graph_diff(from_version: Optional[int] = Query(default=None),
+                     to_version: Optional[int] = Query(default=None),
+                     limit: int = Query(default=100)):
+    if len(GRAPH_SNAPSHOTS) < 2 and (from_version is None or to_version is None):
+        raise HTTPException(404, "Need at least two graph versions to diff")
+    by_version = {snap['version']: snap for snap in GRAPH_SNAPSHOTS}
+    to_version = to_version if to_version is not None else GRAPH_SNAPSHOTS[-1]['version']
+    from_version = from_version if from_version is not None else to_version - 1
+    for v in (from_version, to_version):
+        if v not in by_version:
+            raise HTTPException(404, f"Graph version {v} not retained (have {sorted(by_version)})")
+    return diff_snapshots(by_version[from_version], by_version[to_version], limit=limit)
+
+
 @app.api_route("/api/graph/summary", methods=["GET", "POST"])
 async def graph_summary():
     if 'G' not in GRAPH_CACHE:
@@ -222,6 +594,7 @@ async def graph_summary():
         "variants": GRAPH_CACHE['variants'],
         "edges": len(GRAPH_CACHE['edge_df']),
         "modularity": round(GRAPH_CACHE['modularity'], 4),
+        "version": GRAPH_CACHE.get('version'),
         "communities": len(community_counts),
         "community_sizes": {str(k): int(v) for k, v in sorted(community_counts.items())},
     }
@@ -0,0 +1,98 @@
+import asyncio
+import os
+
+from worker import InferenceWorker
+
+MAX_BATCH_SIZE = int(os.getenv("EVO2_MAX_BATCH_SIZE", "16"))
+MAX_WAIT_MS = float(os.getenv("EVO2_MAX_WAIT_MS", "4"))
+BUCKET_WIDTH = int(os.getenv("EVO2_BUCKET_WIDTH", "256"))
+
+
+class BatchScheduler:
+    """Micro-batch sequences for any scorer exposing `score_sequences(seqs, reduce_method)`.
+
+    Sequences are queued per (param, length bucket) and flushed as one batch call
+    when a bucket reaches `max_batch_size` or its oldest entry has waited
+    `max_wait_ms`. Bucketing by length keeps padding bounded. Batches run on the
+    inference worker at the most urgent priority they contain.
+
+    By default a batch is `scorer.score_sequences(seqs, reduce_method=param)`;
+    pass `batch_fn(seqs, param)` to batch another per-sequence model call.
+    """
+
+    def __init__(self, scorer, worker=None, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS,
+                 bucket_width=BUCKET_WIDTH, batch_fn=None, kind="score_batch"):
+        self.scorer = scorer
+        self.worker = worker or InferenceWorker()
+        self.batch_fn = batch_fn or self._score_batch
+        self.kind = kind
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.bucket_width = bucket_width
+        self._pending = {}
+        self._timers = {}
+        self.stats = {"batches": 0, "sequences": 0, "max_batch": 0}
+
+    def _bucket(self, sequence, param):
+        return param, len(sequence) // self.bucket_width
+
+    async def score(self, sequence, reduce_method="mean", priority=1):
+        return (await self.score_many([sequence], reduce_method, priority=priority))[0]
+
+    async def score_many(self, sequences, reduce_method="mean", priority=1):
+        return await self.submit_many(sequences, reduce_method, priority=priority)
+
+    async def submit_many(self, sequences, param, priority=1):
+        loop = asyncio.get_running_loop()
+        futures = []
+        for sequence in sequences:
+            fut = loop.create_future()
+            key = self._bucket(sequence, param)
+            items = self._pending.setdefault(key, [])
+            items.append((sequence, fut, priority))
+            if len(items) >= self.max_batch_size:
+                self._flush(key)
+            elif len(items) == 1:
+                self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+            futures.append(fut)
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._pending.pop(key, None)
+        if items:
+            asyncio.get_running_loop().create_task(self._run_batch(items, key[0]))
+
+    async def _run_batch(self, items, param):
+        sequences = [seq for seq, _, _ in items]
+        priority = min(p for _, _, p in items)
+        try:
+            results = await self.worker.submit(
+                self.batch_fn, sequences, param, priority=priority, kind=self.kind)
+        except Exception as e:
+            for _, fut, _ in items:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        self.stats["batches"] += 1
+        self.stats["sequences"] += len(sequences)
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(sequences))
+        for (_, fut, _), result in zip(items, results):
+            if not fut.done():
+                fut.set_result(result)
+
+    def _score_batch(self, sequences, reduce_method):
+        scores = self.scorer.score_sequences(sequences, reduce_method=reduce_method)
+        return [float(s) for s in scores]
+
+    def metrics(self):
+        batches = self.stats["batches"]
+        return {
+            "batches": batches,
+            "sequences": self.stats["sequences"],
+            "mean_batch_size": round(self.stats["sequences"] / batches, 2) if batches else 0.0,
+            "max_batch_size": self.stats["max_batch"],
+            "pending": sum(len(items) for items in self._pending.values()),
+        }
@@ -0,0 +1,264 @@
+"""Load benchmark for the Evo2 service in simulated mode.
+
+    python benchmark.py --scenarios score,variant-score,mixed --batch-sizes 1,16,128 \\
+        --concurrency 1,8,32 --requests 200 --latency-ms 20 --json bench.json
+
+The FastAPI app runs in-process on `SimulatedEvo2` (no GPU, no network): each
+client is a coroutine posting through an ASGI transport, so the numbers cover
+request parsing, caching, coalescing, batching and the inference queue. Every
+(scenario, batch size, concurrency) cell is run once and reported as a markdown
+table on stdout and, with `--json`, as JSON.
+
+Scenarios:
+  score          single-sequence /score requests
+  variant-score  Snowflake /variant-score payloads of `batch size` rows
+  mixed          both, drawn by the `--mix` weights
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+SCENARIOS = ("score", "variant-score", "mixed")
+BASES = "ACGT"
+
+
+def _ints(text):
+    return [int(v) for v in text.split(",") if v]
+
+
+def _mix(text):
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("score", "variant-score"):
+            raise argparse.ArgumentTypeError(f"unknown request kind '{name}'")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class Workload:
+    """Seeded request bodies for one benchmark cell.
+
+    Sequences are fresh per cell, so caches warmed by earlier cells do not
+    leak into later ones; `repeat` is the chance a /score sequence or a
+    variant row repeats one already sent in this cell.
+    """
+
+    def __init__(self, seed, length, references, repeat):
+        self.rng = random.Random(seed)
+        self.length = length
+        self.repeat = repeat
+        self.references = [self._sequence() for _ in range(references)]
+        self.sequences = []
+        self.rows = []
+
+    def _sequence(self):
+        return "".join(self.rng.choices(BASES, k=self.length))
+
+    def score(self):
+        if self.sequences and self.rng.random() < self.repeat:
+            sequence = self.rng.choice(self.sequences)
+        else:
+            sequence = self._sequence()
+            self.sequences.append(sequence)
+        return "/score", {"sequence": sequence}, 1
+
+    def variant_row(self):
+        if self.rows and self.rng.random() < self.repeat:
+            return self.rng.choice(self.rows)
+        reference = self.rng.choice(self.references)
+        position = self.rng.randrange(len(reference))
+        alt_base = self.rng.choice([b for b in BASES if b != reference[position]])
+        row = (reference, reference[:position] + alt_base + reference[position + 1:], position)
+        self.rows.append(row)
+        return row
+
+    def variant_score(self, batch_size):
+        data = [[i, *self.variant_row()] for i in range(batch_size)]
+        return "/variant-score", {"data": data}, batch_size
+
+
+async def _client(http, requests, latencies, failures):
+    for path, body, variants in requests:
+        started = time.perf_counter()
+        response = await http.post(path, json=body)
+        elapsed = time.perf_counter() - started
+        if response.status_code == 200:
+            latencies.append((elapsed, variants))
+        else:
+            failures[response.status_code] = failures.get(response.status_code, 0) + 1
+
+
+def _cache_counts(server):
+    counts = {"reference_cache": server.reference_cache.metrics()}
+    if server.score_cache:
+        counts["score_cache"] = server.score_cache.metrics()
+    return {name: (m["hits"], m["misses"]) for name, m in counts.items()}
+
+
+def _hit_rates(before, after):
+    rates = {}
+    for name, (hits, misses) in after.items():
+        hits -= before[name][0]
+        misses -= before[name][1]
+        rates[name] = round(hits / (hits + misses), 4) if hits + misses else None
+    return rates
+
+
+async def run_cell(server, http, args, scenario, batch_size, concurrency, seed):
+    workload = Workload(seed, args.length, args.references, args.repeat)
+    kinds, weights = zip(*args.mix.items())
+    requests = []
+    for _ in range(args.requests):
+        kind = scenario if scenario != "mixed" else workload.rng.choices(kinds, weights)[0]
+        requests.append(workload.score() if kind == "score" else workload.variant_score(batch_size))
+
+    # Round-robin the requests over the clients, each sending its share back to back.
+    shares = [requests[i::concurrency] for i in range(concurrency)]
+    latencies, failures = [], {}
+    server.worker.reset_metrics()
+    batching = server.scheduler.metrics()
+    caches = _cache_counts(server)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_client(http, share, latencies, failures) for share in shares))
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(t * 1000 for t, _ in latencies)
+    inference = server.worker.metrics()
+    batched = server.scheduler.metrics()
+    batches = batched["batches"] - batching["batches"]
+    return {
+        "scenario": scenario,
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "requests": len(requests),
+        "completed": len(latencies),
+        "failed": failures,
+        "seconds": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 2),
+        "variants_per_s": round(sum(v for _, v in latencies) / elapsed, 2),
+        "latency_ms": {
+            "mean": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+            "p50": round(_percentile(ordered, 0.50), 3),
+            "p95": round(_percentile(ordered, 0.95), 3),
+            "p99": round(_percentile(ordered, 0.99), 3),
+        },
+        "queue_wait_ms": inference["wait"],
+        "service_ms": inference["service"],
+        "mean_batch_size": round((batched["sequences"] - batching["sequences"]) / batches, 2) if batches else 0.0,
+        "cache_hit_rate": _hit_rates(caches, _cache_counts(server)),
+    }
+
+
+def markdown(results):
+    def rate(value):
+        return "-" if value is None else f"{value:.0%}"
+
+    lines = [
+        "| scenario | batch | clients | req/s | variants/s | p50 ms | p95 ms | p99 ms "
+        "| queue wait p95 ms | mean batch | score cache hits | ref cache hits | failed |",
+        "|---|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|",
+    ]
+    for r in results:
+        wait = max((s["p95_ms"] for s in r["queue_wait_ms"].values()), default=0.0)
+        lat = r["latency_ms"]
+        lines.append(
+            f"| {r['scenario']} | {r['batch_size']} | {r['concurrency']} | {r['requests_per_s']:.1f} "
+            f"| {r['variants_per_s']:.1f} | {lat['p50']:.1f} | {lat['p95']:.1f} | {lat['p99']:.1f} "
+            f"| {wait:.1f} | {r['mean_batch_size']} | {rate(r['cache_hit_rate'].get('score_cache'))} "
+            f"| {rate(r['cache_hit_rate']['reference_cache'])} | {sum(r['failed'].values())} |"
+        )
+    return "\n".join(lines)
+
+
+async def benchmark(args):
+    import httpx
+    import server
+
+    await server.startup()
+    if server.mode != "simulated":
+        sys.exit(f"Expected simulated mode, got {server.mode}")
+    transport = httpx.ASGITransport(app=server.app)
+    results = []
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as http:
+            seed = args.seed
+            for scenario in args.scenarios:
+                # /score requests carry one sequence, so batch size only matters with variant payloads.
+                batch_sizes = [1] if scenario == "score" else args.batch_sizes
+                for batch_size in batch_sizes:
+                    for concurrency in args.concurrency:
+                        seed += 1
+                        result = await run_cell(server, http, args, scenario, batch_size, concurrency, seed)
+                        results.append(result)
+                        print(f"{scenario} batch={batch_size} clients={concurrency}: "
+                              f"{result['requests_per_s']} req/s, p95 {result['latency_ms']['p95']} ms",
+                              file=sys.stderr)
+    finally:
+        await server.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Evo2 service in simulated mode")
+    parser.add_argument("--scenarios", type=lambda s: s.split(","), default=list(SCENARIOS),
+                        help=f"Comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--batch-sizes", type=_ints, default=[1, 16, 128],
+                        help="Rows per /variant-score payload to sweep")
+    parser.add_argument("--concurrency", type=_ints, default=[1, 8, 32], help="Concurrent clients to sweep")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per cell")
+    parser.add_argument("--mix", type=_mix, default={"score": 1.0, "variant-score": 1.0},
+                        help="Weights for the mixed scenario, e.g. score=3,variant-score=1")
+    parser.add_argument("--length", type=int, default=1000, help="Sequence and reference length (bp)")
+    parser.add_argument("--references", type=int, default=16, help="Distinct references per cell")
+    parser.add_argument("--repeat", type=float, default=0.2,
+                        help="Chance a request or row repeats an earlier one in its cell")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Simulated model cost per batch")
+    parser.add_argument("--ms-per-kb", type=float, default=1, help="Simulated model cost per KB of sequence")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write results as JSON to this file ('-' for stdout)")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    # Configure before the service modules read their environment. Hiding the GPU and
+    # the CPU model forces simulated mode; the score cache goes to a throwaway file.
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    os.environ["EVO2_CPU_MODEL"] = ""
+    os.environ["EVO2_INDEX"] = "0"
+    os.environ["EVO2_SIMULATED_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["EVO2_SIMULATED_MS_PER_KB"] = str(args.ms_per_kb)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("EVO2_SCORE_CACHE_PATH", os.path.join(tmp, "score_cache.sqlite"))
+        results = asyncio.run(benchmark(args))
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k != "json"},
+        "results": results,
+    }
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    print(markdown(results))
+
+
+if __name__ == "__main__":
+    main()
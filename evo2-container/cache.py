@@ -0,0 +1,195 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+REFERENCE_CACHE_SIZE = int(os.getenv("EVO2_REFERENCE_CACHE_SIZE", "4096"))
+SCORE_CACHE_PATH = os.getenv("EVO2_SCORE_CACHE_PATH", "/models/evo2_score_cache.sqlite")
+SCORE_CACHE_MAX_ENTRIES = int(os.getenv("EVO2_SCORE_CACHE_MAX_ENTRIES", "1000000"))
+SCORE_CACHE_FLUSH_S = float(os.getenv("EVO2_SCORE_CACHE_FLUSH_S", "0.5"))
+
+
+def score_key(sequence: str, model_name: str, reduce_method: str) -> str:
+    digest = hashlib.sha256(sequence.encode()).hexdigest()
+    return f"{digest}:{model_name}:{reduce_method}"
+
+
+class LRUScoreCache:
+    """Size-bounded in-memory LRU of sequence scores keyed by `score_key`."""
+
+    def __init__(self, max_entries=REFERENCE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            score = self._entries.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def put(self, key, score):
+        with self._lock:
+            self._entries[key] = score
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def metrics(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class PersistentScoreCache:
+    """Content-addressed score cache in SQLite, shared across restarts and replicas.
+
+    Reads go straight to the database (read-through) on a connection of their
+    own, so a flush in progress never blocks them; writes and LRU timestamps are
+    buffered and flushed by a background thread (write-behind). `get_many`
+    blocks on SQLite, so async callers run it in a thread. Each `namespace` is
+    capped at `max_entries`, evicting least recently used.
+    """
+
+    def __init__(self, path=SCORE_CACHE_PATH, namespace="live", max_entries=SCORE_CACHE_MAX_ENTRIES,
+                 flush_interval_s=SCORE_CACHE_FLUSH_S):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.flush_interval_s = flush_interval_s
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._pending = {}
+        self._flushing = {}
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, score REAL NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS scores_lru ON scores (namespace, last_used)")
+        self.entries = self._count()
+        # WAL lets this connection read while the flush thread holds a write transaction.
+        self._reader = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="evo2-score-cache", daemon=True)
+        self._flusher.start()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                score = self._pending.get(key, self._flushing.get(key))
+                if score is not None:
+                    found[key] = score
+        lookup = [k for k in dict.fromkeys(keys) if k not in found]
+        with self._read_lock:
+            for i in range(0, len(lookup), 500):
+                chunk = lookup[i:i + 500]
+                rows = self._reader.execute(
+                    f"SELECT key, score FROM scores WHERE namespace = ? AND key IN ({','.join('?' * len(chunk))})",
+                    [self.namespace, *chunk],
+                ).fetchall()
+                found.update(rows)
+        now = time.time()
+        with self._lock:
+            for key in found:
+                self._touched[key] = now
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return found
+
+    def put_many(self, scores):
+        with self._lock:
+            self._pending.update(scores)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            touched, self._touched = self._touched, {}
+            # Still visible to readers until committed.
+            self._flushing = pending
+        if not pending and not touched:
+            return
+        now = time.time()
+        with self._db_lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO scores (namespace, key, score, last_used) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (namespace, key) DO UPDATE SET score = excluded.score, last_used = excluded.last_used",
+                    [(self.namespace, k, float(v), now) for k, v in pending.items()],
+                )
+                self._conn.executemany(
+                    "UPDATE scores SET last_used = ? WHERE namespace = ? AND key = ?",
+                    [(ts, self.namespace, k) for k, ts in touched.items() if k not in pending],
+                )
+                if pending:
+                    self.entries = self._count()
+                    excess = self.entries - self.max_entries
+                    if excess > 0:
+                        self._conn.execute(
+                            "DELETE FROM scores WHERE namespace = ? AND key IN ("
+                            " SELECT key FROM scores WHERE namespace = ? ORDER BY last_used LIMIT ?)",
+                            (self.namespace, self.namespace, excess),
+                        )
+                        self.evictions += excess
+                        self.entries -= excess
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+            finally:
+                with self._lock:
+                    self._flushing = {}
+
+    def _count(self):
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM scores WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval_s):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Score cache flush failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        self._flusher.join()
+        self.flush()
+        self._reader.close()
+        self._conn.close()
+
+    def metrics(self):
+        return {
+            "path": self.path,
+            "namespace": self.namespace,
+            "entries": self.entries,
+            "pending_writes": len(self._pending),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
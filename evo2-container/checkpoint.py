@@ -0,0 +1,120 @@
+import json
+import os
+
+import torch
+from safetensors import safe_open
+from safetensors.torch import save_file
+
+
+def set_module(model, name, module):
+    parts = name.split(".")
+    parent = model
+    for part in parts[:-1]:
+        parent = getattr(parent, part)
+    setattr(parent, parts[-1], module)
+
+
+def layer_manifest(model, layer_type):
+    """Constructor arguments of every `layer_type` module, enough to rebuild the replaced layers."""
+    return [
+        {"name": name, "in_features": m.in_features, "out_features": m.out_features, "bias": m.bias is not None}
+        for name, m in model.named_modules()
+        if isinstance(m, layer_type)
+    ]
+
+
+def _owner(key, layers):
+    parts = key.split(".")
+    for i in range(len(parts) - 1, 0, -1):
+        prefix = ".".join(parts[:i])
+        if prefix in layers:
+            return prefix
+    return None
+
+
+def _retie(model, aliases):
+    """Point each alias at its source tensor again, so weights tied before saving are
+    one parameter after loading. Aliases a rebuilt layer turned into a different type,
+    shape or dtype (e.g. a quantized copy of a tied weight) are left as loaded."""
+    for alias, source in aliases.items():
+        module_name, _, attr = alias.rpartition(".")
+        module = model.get_submodule(module_name)
+        source_module_name, _, source_attr = source.rpartition(".")
+        tensor = getattr(module, attr, None)
+        shared = getattr(model.get_submodule(source_module_name), source_attr, None)
+        if (isinstance(tensor, torch.Tensor) and type(tensor) is type(shared)
+                and tensor.shape == shared.shape and tensor.dtype == shared.dtype):
+            setattr(module, attr, shared)
+
+
+def save_quantized(model, directory, manifest):
+    """Write `model.state_dict()` to `model.safetensors` plus `manifest.json`.
+
+    `manifest["layers"]` lists the replaced layers (see `layer_manifest`).
+    Tensors sharing storage (tied weights) are stored once and listed under
+    `aliases`. The manifest is written last, so a directory without one is an
+    incomplete save.
+    """
+    os.makedirs(directory, exist_ok=True)
+    tensors, aliases, seen = {}, {}, {}
+    for key, tensor in model.state_dict().items():
+        ident = (tensor.untyped_storage().data_ptr(), tensor.storage_offset(), tuple(tensor.shape), tensor.dtype)
+        if tensor.numel() and ident in seen:
+            aliases[key] = seen[ident]
+            continue
+        seen[ident] = key
+        tensors[key] = tensor.detach().contiguous().cpu()
+
+    tmp = os.path.join(directory, "model.safetensors.tmp")
+    save_file(tensors, tmp)
+    os.replace(tmp, os.path.join(directory, "model.safetensors"))
+    tmp = os.path.join(directory, "manifest.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump({**manifest, "aliases": aliases}, f, indent=2)
+    os.replace(tmp, os.path.join(directory, "manifest.json"))
+
+
+def load_quantized(skeleton, directory, make_layer, device="cpu"):
+    """Load a `save_quantized` artifact into `skeleton`, typically built on the meta device.
+
+    Each manifest layer is rebuilt by `make_layer(entry, tensors, device)`, where
+    `tensors` maps that layer's state-dict keys (prefix stripped) to tensors;
+    every other tensor is assigned into `skeleton` as-is. Aliases go to whichever
+    layer or tensor owns them and are re-tied to their source once the layers are
+    rebuilt. Tensors are read from the memory-mapped safetensors file only as each
+    one is needed. Returns `(skeleton, manifest)`.
+    """
+    with open(os.path.join(directory, "manifest.json")) as f:
+        manifest = json.load(f)
+    layers = {entry["name"]: entry for entry in manifest["layers"]}
+
+    with safe_open(os.path.join(directory, "model.safetensors"), framework="pt", device=str(device)) as f:
+        per_layer = {name: {} for name in layers}
+        rest = {}
+        for key in f.keys():
+            owner = _owner(key, layers)
+            if owner:
+                per_layer[owner][key[len(owner) + 1:]] = f.get_tensor(key)
+            else:
+                rest[key] = f.get_tensor(key)
+        for alias, source in manifest.get("aliases", {}).items():
+            source_owner = _owner(source, layers)
+            tensor = per_layer[source_owner][source[len(source_owner) + 1:]] if source_owner else rest[source]
+            owner = _owner(alias, layers)
+            if owner:
+                per_layer[owner][alias[len(owner) + 1:]] = tensor
+            else:
+                rest[alias] = tensor
+
+    for name, entry in layers.items():
+        set_module(skeleton, name, make_layer(entry, per_layer[name], device))
+
+    missing, unexpected = skeleton.load_state_dict(rest, strict=False, assign=True)
+    missing = [k for k in missing if _owner(k, layers) is None]
+    if missing or unexpected:
+        raise ValueError(f"Quantized checkpoint mismatch: missing={missing[:5]} unexpected={unexpected[:5]}")
+    _retie(skeleton, manifest.get("aliases", {}))
+    on_meta = [n for n, t in [*skeleton.named_parameters(), *skeleton.named_buffers()] if t.is_meta]
+    if on_meta:
+        raise ValueError(f"Tensors not restored from checkpoint: {on_meta[:5]}")
+    return skeleton, manifest
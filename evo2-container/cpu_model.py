@@ -0,0 +1,65 @@
+import math
+import os
+
+import torch
+
+CPU_MODEL = os.getenv("EVO2_CPU_MODEL", "")
+CPU_THREADS = int(os.getenv("EVO2_CPU_THREADS", "0"))
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def cpu_quota(root: str = CGROUP_ROOT) -> int:
+    """CPUs this container may use: the cgroup CPU quota (v2 or v1) under `root`, capped by CPU affinity."""
+    available = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    quota = period = None
+    try:
+        with open(os.path.join(root, "cpu.max")) as f:
+            q, p = f.read().split()
+            if q != "max":
+                quota, period = int(q), int(p)
+    except (OSError, ValueError):
+        try:
+            with open(os.path.join(root, "cpu", "cpu.cfs_quota_us")) as f:
+                q = int(f.read())
+            with open(os.path.join(root, "cpu", "cpu.cfs_period_us")) as f:
+                p = int(f.read())
+            if q > 0:
+                quota, period = q, p
+        except (OSError, ValueError):
+            pass
+    if quota and period:
+        return max(1, min(available, math.ceil(quota / period)))
+    return max(1, available)
+
+
+def configure_threads(threads: int = CPU_THREADS) -> int:
+    """Size torch's intra-op pool to the container's CPU quota (or `EVO2_CPU_THREADS`).
+
+    Batches already run one at a time on the inference worker, so inter-op
+    parallelism is pinned to one thread.
+    """
+    threads = threads or cpu_quota()
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # can only be set before the first parallel op
+    return threads
+
+
+def quantize_int8(module: torch.nn.Module) -> torch.nn.Module:
+    """Dynamic int8 quantization of every `nn.Linear`: int8 weights, activations
+    quantized per batch at run time. Other layers stay in float32."""
+    return torch.ao.quantization.quantize_dynamic(module.float().eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_evo2_cpu_int8(model_name=CPU_MODEL):
+    """Load an Evo2 checkpoint on CPU with int8 dynamic-quantized linear layers."""
+    from evo2 import Evo2
+
+    threads = configure_threads()
+    print(f"Loading {model_name} on CPU with {threads} threads...")
+    evo2_model = Evo2(model_name)
+    evo2_model.model = quantize_int8(evo2_model.model.cpu())
+    print("Quantized linear layers to dynamic int8")
+    return evo2_model
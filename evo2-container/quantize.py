@@ -1,7 +1,24 @@
+import hashlib
+import json
+import os
+
 import torch
 import bitsandbytes as bnb
 from evo2 import Evo2
 
+from checkpoint import layer_manifest, load_quantized, save_quantized, set_module
+
+QUANTIZED_DIR = os.getenv("EVO2_QUANTIZED_DIR", "/models/quantized")
+QUANT_CONFIG = {"method": "bitsandbytes", "quant_type": "nf4", "compute_dtype": "bfloat16"}
+CHECKPOINT_FORMAT = 1
+
+
+def quant_config_hash(model_name, config=QUANT_CONFIG):
+    """Key of a quantized artifact; any change to model, quantization settings or
+    bitsandbytes version yields a new one and forces re-quantization."""
+    payload = {"model": model_name, "config": config, "bitsandbytes": bnb.__version__, "format": CHECKPOINT_FORMAT}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+
 
 def quantize_model_4bit(model):
     """Replace linear layers with 4-bit quantized versions using bitsandbytes."""
@@ -23,20 +40,65 @@ def quantize_model_4bit(model):
             )
             if has_bias:
                 quantized.bias = module.bias
-            replacements[name] = quantized
+            # Params4bit packs its weight on the move to the GPU.
+            replacements[name] = quantized.to(module.weight.device)
 
     for name, quantized_module in replacements.items():
-        parts = name.split(".")
-        parent = model
-        for part in parts[:-1]:
-            parent = getattr(parent, part)
-        setattr(parent, parts[-1], quantized_module)
+        set_module(model, name, quantized_module)
 
     return model
 
 
-def load_evo2_4bit(model_name="evo2_7b"):
-    """Load Evo2 model and quantize to 4-bit."""
+def _make_linear4bit(entry, tensors, device):
+    layer = bnb.nn.Linear4bit(
+        entry["in_features"],
+        entry["out_features"],
+        bias=entry["bias"],
+        compute_dtype=torch.bfloat16,
+        quant_type="nf4",
+        device="meta",
+    )
+    stats = {k[len("weight."):]: v for k, v in tensors.items() if k.startswith("weight.")}
+    layer.weight = bnb.nn.Params4bit.from_prequantized(
+        data=tensors["weight"], quantized_stats=stats, requires_grad=False, device=device)
+    if entry["bias"]:
+        layer.bias = torch.nn.Parameter(tensors["bias"], requires_grad=False)
+    return layer
+
+
+def _evo2_skeleton(model_name):
+    """Evo2 wrapper whose StripedHyena is built on the meta device, so no full-precision
+    weights are read or allocated."""
+    import pkgutil
+    import yaml
+    from evo2 import models as evo2_models
+
+    config_path = evo2_models.CONFIG_MAP[model_name]
+    config = evo2_models.dotdict(yaml.load(pkgutil.get_data("evo2", config_path), Loader=yaml.FullLoader))
+    wrapper = Evo2.__new__(Evo2)
+    with torch.device("meta"):
+        wrapper.model = evo2_models.StripedHyena(config)
+    wrapper.tokenizer = evo2_models.CharLevelTokenizer(512)
+    return wrapper
+
+
+def load_evo2_4bit(model_name="evo2_7b", cache_dir=QUANTIZED_DIR):
+    """Load Evo2 quantized to 4-bit, from the cached quantized checkpoint when one
+    matches this model and quantization config, else quantize and cache it."""
+    config_hash = quant_config_hash(model_name)
+    directory = os.path.join(cache_dir, f"{model_name}-{config_hash}")
+
+    if os.path.exists(os.path.join(directory, "manifest.json")):
+        print(f"Loading pre-quantized {model_name} from {directory}...")
+        try:
+            evo2_model = _evo2_skeleton(model_name)
+            evo2_model.model, _ = load_quantized(evo2_model.model, directory, _make_linear4bit, device="cuda:0")
+            print(f"GPU memory: {torch.cuda.memory_allocated() / 1024**3:.1f} GB")
+            return evo2_model
+        except Exception as e:
+            print(f"Pre-quantized load failed ({e}); re-quantizing")
+            torch.cuda.empty_cache()
+
     print(f"Loading {model_name} in full precision...")
     evo2_model = Evo2(model_name)
 
@@ -48,6 +110,17 @@ def load_evo2_4bit(model_name="evo2_7b"):
     mem_gb = torch.cuda.memory_allocated() / 1024**3
     print(f"GPU memory after quantization: {mem_gb:.1f} GB")
 
+    try:
+        save_quantized(evo2_model.model, directory, {
+            "model": model_name,
+            "config": QUANT_CONFIG,
+            "config_hash": config_hash,
+            "layers": layer_manifest(evo2_model.model, bnb.nn.Linear4bit),
+        })
+        print(f"Saved quantized checkpoint to {directory}")
+    except OSError as e:
+        print(f"Could not save quantized checkpoint: {e}")
+
     return evo2_model
 
 
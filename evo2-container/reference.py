@@ -0,0 +1,117 @@
+import mmap
+import os
+
+REFERENCE_FASTA = os.getenv("EVO2_REFERENCE_FASTA", "/models/reference/GRCh38.fa")
+VARIANT_WINDOW = int(os.getenv("EVO2_VARIANT_WINDOW", "8192"))
+
+_NEWLINES = b"\r\n"
+_UPPER = bytes.maketrans(b"abcdefghijklmnopqrstuvwxyz", b"ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+
+
+def build_fai(path: str) -> list:
+    """Scan a FASTA and return `.fai` rows: (name, length, offset, line_bases, line_width)."""
+    entries = []
+    name = None
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            if line.startswith(b">"):
+                if name is not None:
+                    entries.append((name, length, seq_offset, line_bases, line_width))
+                name = line[1:].split()[0].decode()
+                length, seq_offset, line_bases, line_width = 0, offset + len(line), 0, 0
+            elif name is not None:
+                bases = len(line.rstrip(_NEWLINES))
+                if line_bases == 0:
+                    line_bases, line_width = bases, len(line)
+                length += bases
+            offset += len(line)
+    if name is not None:
+        entries.append((name, length, seq_offset, line_bases, line_width))
+    return entries
+
+
+class FastaReference:
+    """Read-only, memory-mapped FASTA with a samtools-style `.fai` index.
+
+    The file is mapped once; the OS page cache backs it, so every worker
+    process that opens the same FASTA shares the same physical pages. `fetch`
+    only touches the lines covering the requested range. A missing `.fai` is
+    built on open and written next to the FASTA when the directory allows it.
+    """
+
+    def __init__(self, path=REFERENCE_FASTA):
+        self.path = path
+        fai_path = path + ".fai"
+        if os.path.exists(fai_path):
+            with open(fai_path) as f:
+                rows = [line.rstrip("\n").split("\t") for line in f if line.strip()]
+            entries = [(r[0], int(r[1]), int(r[2]), int(r[3]), int(r[4])) for r in rows]
+        else:
+            entries = build_fai(path)
+            try:
+                with open(fai_path, "w") as f:
+                    f.writelines("\t".join(map(str, e)) + "\n" for e in entries)
+            except OSError:
+                pass
+        self.index = {name: (length, offset, line_bases, line_width)
+                      for name, length, offset, line_bases, line_width in entries}
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.fetches = 0
+
+    def _resolve(self, chrom: str):
+        entry = self.index.get(chrom)
+        if entry is None and chrom.startswith("chr"):
+            entry = self.index.get(chrom[3:])
+        elif entry is None:
+            entry = self.index.get("chr" + chrom)
+        if entry is None:
+            raise KeyError(f"Unknown contig '{chrom}'")
+        return entry
+
+    def length(self, chrom: str) -> int:
+        return self._resolve(chrom)[0]
+
+    def fetch(self, chrom: str, start: int, end: int) -> str:
+        """Uppercase bases in 0-based half-open `[start, end)`, clipped to the contig."""
+        length, offset, line_bases, line_width = self._resolve(chrom)
+        start, end = max(start, 0), min(end, length)
+        if start >= end:
+            return ""
+        first = offset + (start // line_bases) * line_width + start % line_bases
+        last = offset + ((end - 1) // line_bases) * line_width + (end - 1) % line_bases + 1
+        self.fetches += 1
+        # One C-level pass uppercases and drops line breaks.
+        return self._mm[first:last].translate(_UPPER, _NEWLINES).decode("ascii")
+
+    def variant_window(self, chrom: str, pos: int, window: int = VARIANT_WINDOW) -> tuple:
+        """Window of about `window` bases centred on 1-based `pos`, clipped to the contig.
+
+        Returns `(sequence, offset)` where `offset` is the variant's index in `sequence`.
+        """
+        length = self.length(chrom)
+        pos0 = pos - 1
+        if not 0 <= pos0 < length:
+            raise ValueError(f"Position {pos} outside {chrom} (length {length})")
+        start = max(0, min(pos0 - window // 2, length - window))
+        return self.fetch(chrom, start, start + window), pos0 - start
+
+    def tiled_window(self, chrom: str, pos: int, window: int = VARIANT_WINDOW) -> tuple:
+        """Like `variant_window`, but from a fixed grid of tiles stepping by `window // 2`,
+        picking the tile whose central half holds the variant. Nearby variants get the
+        same tile, so its reference is scored once for all of them."""
+        length = self.length(chrom)
+        pos0 = pos - 1
+        if not 0 <= pos0 < length:
+            raise ValueError(f"Position {pos} outside {chrom} (length {length})")
+        step = max(window // 2, 1)
+        start = max(0, min((pos0 // step) * step - window // 4, length - window))
+        return self.fetch(chrom, start, start + window), pos0 - start
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def metrics(self):
+        return {"path": self.path, "contigs": len(self.index), "fetches": self.fetches}
@@ -0,0 +1,65 @@
+"""Stream a VCF through the Evo2 service's /score-vcf endpoint.
+
+    python score_vcf.py patient.vcf.gz --regions CYP2C19 --format tsv -o patient.evo2.tsv
+
+The file is uploaded as-is (plain, gzip or bgzip) and the annotated output is
+written as it arrives, so neither side holds the whole VCF in memory.
+"""
+import argparse
+import http.client
+import os
+import shutil
+import sys
+import threading
+import urllib.parse
+
+UPLOAD_CHUNK = 64 * 1024
+
+
+def _upload(conn, path):
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK):
+            conn.send(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Annotate a VCF with Evo2 variant effect scores")
+    parser.add_argument("vcf", help="Input VCF (.vcf, .vcf.gz or bgzipped)")
+    parser.add_argument("--url", default=os.getenv("EVO2_URL", "http://localhost:8080"), help="Evo2 service URL")
+    parser.add_argument("--regions", default="", help="Comma-separated chrom, chrom:start-end or gene names")
+    parser.add_argument("--format", choices=("vcf", "tsv"), default="vcf")
+    parser.add_argument("--window", type=int, help="Reference window per variant (bp)")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    parser.add_argument("--timeout", type=float, default=3600)
+    args = parser.parse_args()
+
+    url = urllib.parse.urlsplit(args.url)
+    params = {"regions": args.regions, "format": args.format, "window": args.window}
+    path = f"{url.path.rstrip('/')}/score-vcf?{urllib.parse.urlencode({k: v for k, v in params.items() if v})}"
+    conn_cls = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+    conn = conn_cls(url.netloc, timeout=args.timeout)
+
+    conn.putrequest("POST", path)
+    conn.putheader("Content-Type", "application/octet-stream")
+    conn.putheader("Content-Length", str(os.path.getsize(args.vcf)))
+    conn.endheaders()
+    # The server streams results while it is still reading the upload, so send
+    # on a separate thread; otherwise both sides can block on full socket buffers.
+    uploader = threading.Thread(target=_upload, args=(conn, args.vcf), daemon=True)
+    uploader.start()
+
+    response = conn.getresponse()
+    if response.status != 200:
+        sys.exit(f"{response.status} {response.reason}: {response.read().decode(errors='replace')}")
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        shutil.copyfileobj(response, out, UPLOAD_CHUNK)
+    finally:
+        if args.output:
+            out.close()
+    uploader.join()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
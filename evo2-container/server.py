@@ -1,17 +1,55 @@
 import os
 import json
+import asyncio
+import base64
 import hashlib
+import io
 import math
+import sqlite3
+import time
+import numpy as np
 import torch
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 
+try:
+    import orjson
+except ImportError:  # optional: faster encoding of large Snowflake batch responses
+    orjson = None
+
+from batching import BatchScheduler
+from cpu_model import CPU_MODEL
+from simulated import SimulatedEvo2
+from cache import LRUScoreCache, PersistentScoreCache, score_key
+from singleflight import SingleFlight
+from worker import PRIORITIES, InferenceWorker, QueueFull
+from reference import REFERENCE_FASTA, VARIANT_WINDOW, FastaReference
+from vcf import VCF_CHUNK, RegionFilter, aiter_lines, format_record, output_header
+from vector_index import INDEX_PATH, EmbeddingIndex
+from windowing import (SCORE_WINDOW, WINDOW_OVERLAP, WINDOW_REDUCTIONS, contributions, covering,
+                       plan_windows, range_reductions, reduce_patched, reduce_track, stitch)
+
 app = FastAPI(title="Evo2 7B Genomic API", version="1.0.0")
 
 model = None
 fp8_available = False
+mode = "simulated"
+model_device = "cuda:0"
+scheduler = None
+embedding_scheduler = None
+logprob_scheduler = None
+worker = None
+model_name = os.getenv("EVO2_MODEL", "evo2_7b")
+reference_cache = LRUScoreCache()
+inflight = SingleFlight()
+variant_rows = {"rows": 0, "deduplicated": 0}
+track_cache = LRUScoreCache(max_entries=int(os.getenv("EVO2_TRACK_CACHE_SIZE", "16")))
+score_cache = None
+embedding_index = None
+reference_genome = None
+INDEX_LAYER = os.getenv("EVO2_INDEX_LAYER", "blocks.28.mlp.l3")
 
 KNOWN_VARIANTS = {
     90: {"delta": -0.734, "prediction": "Likely pathogenic"},
@@ -19,6 +57,8 @@ KNOWN_VARIANTS = {
     30: {"delta": 0.217, "prediction": "Possibly beneficial"},
 }
 
+BASES = "ACGT"
+
 BASE_TRANSITION_WEIGHTS = {
     ('A', 'G'): -0.15, ('G', 'A'): -0.28,
     ('C', 'T'): -0.12, ('T', 'C'): -0.14,
@@ -39,33 +79,34 @@ def _mock_score_sequence(sequence: str) -> float:
     return base_score + gc_adjustment + seq_noise
 
 
-def _mock_variant_impl(reference: str, alternative: str, position: int) -> dict:
-    ref_base = reference[position]
-    alt_base = alternative[position]
+def _classify_delta(delta: float) -> str:
+    if delta < -0.5:
+        return "Likely pathogenic"
+    elif delta < -0.1:
+        return "Possibly damaging"
+    elif delta < 0.1:
+        return "Benign/Neutral"
+    return "Possibly beneficial"
+
 
+def _mock_variant_delta(ref_base: str, alt_base: str, position: int) -> tuple:
     known = KNOWN_VARIANTS.get(position)
     if known:
+        return known["delta"], known["prediction"]
+    base_weight = BASE_TRANSITION_WEIGHTS.get((ref_base, alt_base), -0.30)
+    pos_factor = math.sin(position * 0.1) * 0.05
+    delta = base_weight + pos_factor
+    return delta, _classify_delta(delta)
+
+
+def _mock_variant_impl(reference: str, alternative: str, position: int, ref_score: Optional[float] = None) -> dict:
+    ref_base = reference[position]
+    alt_base = alternative[position]
+    if ref_score is None:
         ref_score = _mock_score_sequence(reference)
-        delta = known["delta"]
-        alt_score = ref_score + delta
-        prediction = known["prediction"]
-    else:
-        ref_score = _mock_score_sequence(reference)
-        alt_seq = reference[:position] + alt_base + reference[position + 1:]
-        alt_score = _mock_score_sequence(alt_seq)
-        base_weight = BASE_TRANSITION_WEIGHTS.get((ref_base, alt_base), -0.30)
-        pos_factor = math.sin(position * 0.1) * 0.05
-        delta = base_weight + pos_factor
-        alt_score = ref_score + delta
-
-        if delta < -0.5:
-            prediction = "Likely pathogenic"
-        elif delta < -0.1:
-            prediction = "Possibly damaging"
-        elif delta < 0.1:
-            prediction = "Benign/Neutral"
-        else:
-            prediction = "Possibly beneficial"
+
+    delta, prediction = _mock_variant_delta(ref_base, alt_base, position)
+    alt_score = ref_score + delta
 
     return {
         "position": position,
@@ -81,6 +122,11 @@ def _mock_variant_impl(reference: str, alternative: str, position: int) -> dict:
 class ScoreRequest(BaseModel):
     sequence: str
     reduce_method: str = "mean"
+    window: Optional[int] = None
+    overlap: Optional[int] = None
+    return_track: bool = False
+    track_encoding: str = "raw"
+    ranges: Optional[list] = None
 
 
 class GenerateRequest(BaseModel):
@@ -90,9 +136,22 @@ class GenerateRequest(BaseModel):
     top_k: int = 4
 
 
+class GenerateStreamRequest(GenerateRequest):
+    chunk_tokens: int = 16
+    format: str = "sse"
+
+
+POOLING_MODES = ("mean", "max", "cls", "none")
+
+
 class EmbeddingRequest(BaseModel):
-    sequence: str
+    sequence: Optional[str] = None
+    sequences: Optional[list] = None
     layer_name: str = "blocks.28.mlp.l3"
+    layer_names: Optional[list] = None
+    pooling: Optional[str] = None
+    dtype: str = "float16"
+    encoding: str = "npy"
 
 
 class VariantScoreRequest(BaseModel):
@@ -101,9 +160,41 @@ class VariantScoreRequest(BaseModel):
     position: int
 
 
+class GenomicVariantRequest(BaseModel):
+    chrom: str
+    pos: int
+    ref: str
+    alt: str
+    window: Optional[int] = None
+
+
+class SaturationScanRequest(BaseModel):
+    reference: str
+    start: int = 0
+    end: Optional[int] = None
+    stream: bool = False
+    chunk_size: int = 256
+
+
+class IndexAddRequest(BaseModel):
+    sequences: list
+    labels: Optional[list] = None
+
+
+class NeighborsRequest(BaseModel):
+    sequence: str
+    k: int = 10
+    n_probe: Optional[int] = None
+    add: bool = False
+    label: Optional[str] = None
+
+
 class ScoreResponse(BaseModel):
     sequence_length: int
     score: float
+    windows: Optional[int] = None
+    track: Optional[dict] = None
+    ranges: Optional[list] = None
 
 
 class GenerateResponse(BaseModel):
@@ -130,8 +221,8 @@ class VariantScoreResponse(BaseModel):
 
 @app.on_event("startup")
 async def startup():
-    global model, fp8_available
-    model_name = os.getenv("EVO2_MODEL", "evo2_7b")
+    global model, model_name, mode, model_device, fp8_available, worker
+    global scheduler, embedding_scheduler, logprob_scheduler, score_cache, embedding_index, reference_genome
 
     if torch.cuda.is_available():
         cap = torch.cuda.get_device_capability()
@@ -139,15 +230,93 @@ async def startup():
         gpu_name = torch.cuda.get_device_name(0)
         print(f"GPU: {gpu_name}, compute capability: {cap[0]}.{cap[1]}, FP8: {fp8_available}")
 
+    worker = InferenceWorker()
+
     if fp8_available:
         print(f"Loading {model_name} with 4-bit quantization...")
         from quantize import load_evo2_4bit
         model = load_evo2_4bit(model_name)
+        scheduler = BatchScheduler(model, worker)
+        embedding_scheduler = BatchScheduler(model, worker, batch_fn=_embed_batch, kind="embeddings")
+        logprob_scheduler = BatchScheduler(model, worker, batch_fn=_logprobs_batch, kind="logprobs")
+        mode = "live"
         print("Model loaded and ready!")
-    else:
+    elif CPU_MODEL:
+        print(f"No FP8-capable GPU. Loading {CPU_MODEL} for CPU int8 inference...")
+        try:
+            from cpu_model import load_evo2_cpu_int8
+            model = load_evo2_cpu_int8(CPU_MODEL)
+            model_name, model_device, mode = CPU_MODEL, "cpu", "cpu"
+            scheduler = BatchScheduler(model, worker, batch_fn=_reduce_logprobs_batch)
+            embedding_scheduler = BatchScheduler(model, worker, batch_fn=_embed_batch, kind="embeddings")
+            logprob_scheduler = BatchScheduler(model, worker, batch_fn=_logprobs_batch, kind="logprobs")
+            print("CPU model loaded and ready!")
+        except Exception as e:
+            print(f"CPU model unavailable ({e}).")
+
+    if mode == "simulated":
         print(f"FP8 not available (need 8.9+). Running in simulated mode.")
         print("Scores are based on known CYP2C19 variant literature data.")
         model = "simulated"
+        simulated = SimulatedEvo2()
+        scheduler = BatchScheduler(simulated, worker)
+        embedding_scheduler = BatchScheduler(
+            simulated, worker, kind="embeddings",
+            batch_fn=lambda seqs, param: simulated.embed(seqs, *param),
+        )
+        logprob_scheduler = BatchScheduler(
+            simulated, worker, kind="logprobs",
+            batch_fn=lambda seqs, param: simulated.logprobs(seqs),
+        )
+
+    if os.getenv("EVO2_SCORE_CACHE", "1") != "0":
+        namespace = mode
+        try:
+            score_cache = PersistentScoreCache(namespace=namespace)
+            print(f"Score cache: {score_cache.path} [{namespace}], {score_cache.entries} entries")
+        except (OSError, sqlite3.Error) as e:
+            print(f"Score cache disabled: {e}")
+
+    if os.getenv("EVO2_INDEX", "1") != "0":
+        try:
+            embedding_index = EmbeddingIndex(os.path.join(INDEX_PATH, mode))
+            print(f"Embedding index: {embedding_index.path} [{INDEX_LAYER}], {len(embedding_index)} vectors")
+        except (OSError, ValueError) as e:
+            print(f"Embedding index disabled: {e}")
+
+    if os.path.exists(REFERENCE_FASTA):
+        reference_genome = FastaReference(REFERENCE_FASTA)
+        print(f"Reference genome: {REFERENCE_FASTA}, {len(reference_genome.index)} contigs")
+    else:
+        print(f"Reference genome not found at {REFERENCE_FASTA}; genomic variant rows disabled")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if score_cache:
+        score_cache.close()
+    if embedding_index is not None:
+        embedding_index.save_ivf()
+    if reference_genome:
+        reference_genome.close()
+
+
+@app.exception_handler(QueueFull)
+async def queue_full_handler(request: Request, exc: QueueFull):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _admit(endpoint: str):
+    if not model:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    try:
+        worker.admit(endpoint)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
 
 @app.api_route("/health", methods=["GET", "POST"])
@@ -155,8 +324,18 @@ async def health(request: Request):
     result = {
         "status": "healthy",
         "model_loaded": model is not None,
-        "mode": "live" if fp8_available else "simulated",
+        "mode": mode,
+        "model": model_name if mode != "simulated" else None,
         "gpu_memory_gb": round(torch.cuda.memory_allocated() / 1024**3, 2) if torch.cuda.is_available() else 0,
+        "batching": scheduler.metrics() if scheduler else None,
+        "reference_cache": reference_cache.metrics(),
+        "coalescing": inflight.metrics(),
+        "variant_rows": variant_rows,
+        "track_cache": track_cache.metrics(),
+        "reference_genome": reference_genome.metrics() if reference_genome else None,
+        "score_cache": score_cache.metrics() if score_cache else None,
+        "inference": worker.metrics() if worker else None,
+        "embedding_index": embedding_index.metrics() if embedding_index is not None else None,
     }
     if request.method == "POST":
         body = await request.json()
@@ -165,108 +344,532 @@ async def health(request: Request):
     return result
 
 
-@app.post("/score", response_model=ScoreResponse)
+@app.post("/score", response_model=ScoreResponse, response_model_exclude_none=True)
 async def score_sequence(req: ScoreRequest):
-    if not model:
-        raise HTTPException(status_code=503, detail="Model not loaded")
+    """Score a sequence. Sequences longer than `EVO2_SCORE_WINDOW`, or requests that set
+    `window`, are scored in overlapping windows whose per-position log-likelihoods are
+    stitched and reduced with `reduce_method` (mean, sum, min or max).
 
-    if fp8_available:
-        try:
-            scores = model.score_sequences(
-                [req.sequence],
-                reduce_method=req.reduce_method,
-            )
-            return ScoreResponse(
+    `return_track` adds the per-position log-likelihood track as float16 binary, and
+    `ranges` adds mean/sum/min/max over each `[start, end)`. Both come from one track,
+    however many ranges are requested, and `score` is then reduced from that same
+    track rather than from a separate scoring pass."""
+    _admit("score")
+
+    windowed = req.window is not None or _windowed(len(req.sequence))
+    wants_track = req.return_track or req.ranges is not None
+    if windowed or wants_track:
+        window, overlap = _window_config(req.window, req.overlap)
+        if req.reduce_method not in WINDOW_REDUCTIONS:
+            raise HTTPException(status_code=400, detail=f"reduce_method must be one of {WINDOW_REDUCTIONS}")
+    if req.track_encoding not in ("raw", "npy"):
+        raise HTTPException(status_code=400, detail="track_encoding must be raw or npy")
+    ranges = _score_ranges(req.ranges, len(req.sequence)) if req.ranges is not None else None
+
+    try:
+        if windowed or wants_track:
+            windows, track, _ = await _sequence_track(req.sequence, window, overlap, PRIORITIES["score"])
+            result = ScoreResponse(
                 sequence_length=len(req.sequence),
-                score=float(scores[0]),
+                score=reduce_track(track, req.reduce_method),
+                windows=len(windows) if windowed else None,
             )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
-    else:
-        score = _mock_score_sequence(req.sequence)
-        return ScoreResponse(
-            sequence_length=len(req.sequence),
-            score=score,
-        )
+        else:
+            (score,) = await _score_sequences([req.sequence], req.reduce_method, PRIORITIES["score"])
+            result = ScoreResponse(sequence_length=len(req.sequence), score=score)
+        if req.return_track:
+            result.track = _encode_array(track.astype(np.float16), req.track_encoding)
+        if ranges is not None:
+            result.ranges = range_reductions(track, ranges)
+    except QueueFull:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return result
 
 
-def _score_variant_impl(reference: str, alternative: str, position: int) -> dict:
-    if fp8_available:
-        ref_scores = model.score_sequences([reference], reduce_method="mean")
-        alt_seq = (
-            reference[:position]
-            + alternative[position]
-            + reference[position + 1:]
-        )
-        alt_scores = model.score_sequences([alt_seq], reduce_method="mean")
-
-        ref_score = float(ref_scores[0])
-        alt_score = float(alt_scores[0])
-        delta = alt_score - ref_score
-
-        if delta < -0.5:
-            prediction = "Likely pathogenic"
-        elif delta < -0.1:
-            prediction = "Possibly damaging"
-        elif delta < 0.1:
-            prediction = "Benign/Neutral"
+def _score_ranges(ranges: list, length: int) -> list:
+    try:
+        ranges = [(int(start), int(end)) for start, end in ranges]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="ranges must be a list of [start, end] pairs")
+    for start, end in ranges:
+        if not 0 <= start < end <= length:
+            raise HTTPException(status_code=400, detail=f"range [{start}, {end}) is not within [0, {length})")
+    return ranges
+
+
+def _window_config(window: Optional[int], overlap: Optional[int]) -> tuple:
+    window = window or SCORE_WINDOW
+    overlap = min(WINDOW_OVERLAP, window // 2) if overlap is None else overlap
+    if window < 2 or not 0 <= overlap < window:
+        raise HTTPException(status_code=400, detail="window must be >= 2 and overlap in [0, window)")
+    return window, overlap
+
+
+def _windowed(length: int) -> bool:
+    """Whether a sequence is too long to score in one pass. The simulated scorer has no
+    context limit, so it keeps scoring long sequences whole."""
+    return mode != "simulated" and length > SCORE_WINDOW
+
+
+async def _sequence_track(sequence: str, window: int, overlap: int, priority: int) -> tuple:
+    """Windows, stitched per-position log-likelihood track and its float64 sum (LRU-cached).
+
+    All windows go through the log-likelihood scheduler together, so they are
+    batched like any other sequences. Concurrent requests for the same track
+    (sequence digest, model, window and overlap) share one computation.
+    """
+    key = score_key(sequence, model_name, f"track:{window}:{overlap}")
+    cached = track_cache.get(key)
+    if cached is None:
+        async def compute(owned):
+            windows = plan_windows(len(sequence), window, overlap)
+            tracks = await logprob_scheduler.submit_many(
+                [sequence[start:end] for start, end in windows], None, priority=priority)
+            track = stitch(len(sequence), windows, tracks)
+            result = (windows, track, float(np.sum(track, dtype=np.float64)))
+            track_cache.put(key, result)
+            return [result]
+
+        (cached,) = await inflight.do_many([key], compute, "track")
+    return cached
+
+
+async def _score_sequences(sequences: list, reduce_method: str, priority: int) -> list:
+    """Score through the persistent cache, sending only misses to the scheduler."""
+    keys = [score_key(seq, model_name, reduce_method) for seq in sequences]
+    found = await asyncio.to_thread(score_cache.get_many, keys) if score_cache else {}
+    missing = {key: seq for key, seq in zip(keys, sequences) if key not in found}
+    if missing:
+        async def compute(owned):
+            scores = await scheduler.score_many([missing[k] for k in owned], reduce_method=reduce_method,
+                                                priority=priority)
+            if score_cache:
+                score_cache.put_many(dict(zip(owned, scores)))
+            return scores
+
+        # Sequences another request is already scoring are awaited, not rescored.
+        found.update(zip(missing, await inflight.do_many(list(missing), compute, "score")))
+    return [found[key] for key in keys]
+
+
+async def _reference_score(reference: str, priority: int) -> float:
+    """Mean log-likelihood of `reference`; long references take the mean of their
+    windowed track, matching the `ref_score` of `_score_windowed_group`."""
+    key = score_key(reference, model_name, "mean")
+    score = reference_cache.get(key)
+    if score is None:
+        if _windowed(len(reference)):
+            _, track, total = await _sequence_track(reference, *_window_config(None, None), priority)
+            score = total / max(len(track), 1)
         else:
-            prediction = "Possibly beneficial"
-
-        return {
-            "position": position,
-            "ref_base": reference[position],
-            "alt_base": alternative[position],
-            "ref_score": ref_score,
-            "alt_score": alt_score,
-            "delta_score": delta,
-            "prediction": prediction,
-        }
-    else:
-        return _mock_variant_impl(reference, alternative, position)
+            score = (await _score_sequences([reference], "mean", priority))[0]
+        reference_cache.put(key, score)
+    return score
+
+
+def _variant_result(reference: str, alternative: str, position: int, ref_score: float, alt_score: float) -> dict:
+    delta = alt_score - ref_score
+    return {
+        "position": position,
+        "ref_base": reference[position],
+        "alt_base": alternative[position],
+        "ref_score": ref_score,
+        "alt_score": alt_score,
+        "delta_score": delta,
+        "prediction": _classify_delta(delta),
+    }
+
+
+async def _score_windowed_group(reference: str, variants: list, priority: int) -> list:
+    """Variant deltas against a long reference, rescoring only the windows covering each
+    variant and patching their contribution into the cached reference track."""
+    window, overlap = _window_config(None, None)
+    windows, track, total = await _sequence_track(reference, window, overlap, priority)
+    spans = contributions(windows)
+    ref_score = total / max(len(track), 1)
+
+    jobs, alt_windows = [], []
+    for i, (alternative, position) in enumerate(variants):
+        for k in covering(windows, position):
+            start, end = windows[k]
+            alt_windows.append(reference[start:position] + alternative[position] + reference[position + 1:end])
+            jobs.append((i, k))
+    alt_tracks = await logprob_scheduler.submit_many(alt_windows, None, priority=priority)
+
+    patches = [[] for _ in variants]
+    for (i, k), alt_track in zip(jobs, alt_tracks):
+        (start, _), (lo, hi) = windows[k], spans[k]
+        patches[i].append((lo - 1, alt_track[lo - start - 1:hi - start - 1]))
+
+    return [
+        _variant_result(reference, alternative, position, ref_score,
+                        reduce_patched(track, total, variant_patches, "mean"))
+        for (alternative, position), variant_patches in zip(variants, patches)
+    ]
+
+
+async def _score_reference_group(reference: str, variants: list, priority: int) -> list:
+    if _windowed(len(reference)):
+        return await _score_windowed_group(reference, variants, priority)
+
+    ref_score = await _reference_score(reference, priority)
+    if mode == "simulated":
+        return [_mock_variant_impl(reference, alternative, position, ref_score=ref_score)
+                for alternative, position in variants]
+
+    alt_seqs = [
+        reference[:position] + alternative[position] + reference[position + 1:]
+        for alternative, position in variants
+    ]
+    alt_scores = await _score_sequences(alt_seqs, "mean", priority)
+
+    return [
+        _variant_result(reference, alternative, position, ref_score, alt_score)
+        for (alternative, position), alt_score in zip(variants, alt_scores)
+    ]
+
+
+async def _score_variant_rows(rows: list, priority: int = PRIORITIES["variant-score"]) -> list:
+    """Score (reference, alternative, position) rows. Identical rows, within this call or
+    in flight for another request, are scored once."""
+    digests = {}
+    keys = []
+    for reference, alternative, position in rows:
+        digest = digests.get(reference)
+        if digest is None:
+            digest = digests[reference] = hashlib.sha256(reference.encode()).hexdigest()
+        # Only the base at `position` of `alternative` is used.
+        keys.append(f"{digest}:{position}:{alternative[position]}:{model_name}")
+    by_key = dict(zip(keys, rows))
+
+    async def compute(owned):
+        return await _score_grouped_variant_rows([by_key[k] for k in owned], priority)
+
+    return await inflight.do_many(keys, compute, "variant-score")
+
+
+async def _score_grouped_variant_rows(rows: list, priority: int) -> list:
+    """Score rows grouped by reference, so each distinct reference is scored once and its
+    alternates are batched together."""
+    groups = {}
+    for i, (reference, alternative, position) in enumerate(rows):
+        groups.setdefault(reference, []).append((i, alternative, position))
+
+    group_results = await asyncio.gather(*(
+        _score_reference_group(reference, [(alt, pos) for _, alt, pos in members], priority)
+        for reference, members in groups.items()
+    ))
+
+    results = [None] * len(rows)
+    for members, scored in zip(groups.values(), group_results):
+        for (i, _, _), result in zip(members, scored):
+            results[i] = result
+    return results
+
+
+async def _score_variant_impl(reference: str, alternative: str, position: int) -> dict:
+    return (await _score_variant_rows([(reference, alternative, position)]))[0]
 
 
 @app.post("/variant-score")
 async def score_variant(request: Request):
-    if not model:
-        raise HTTPException(status_code=503, detail="Model not loaded")
+    _admit("variant-score")
 
     try:
         body = await request.json()
 
         if "data" in body:
-            results = []
-            for row in body["data"]:
-                row_num = row[0]
-                reference = row[1]
-                alternative = row[2]
-                position = int(row[3])
-                result = _score_variant_impl(reference, alternative, position)
-                results.append([row_num, result])
-            return JSONResponse({"data": results})
+            return Response(await _variant_score_batch(body["data"]), media_type="application/json")
+
+        if "chrom" in body:
+            req = GenomicVariantRequest(**body)
+            variant = _genomic_variants([(req.chrom, req.pos, req.ref, req.alt, req.window)])[0]
+            return {**await _score_variant_impl(*variant), "chrom": req.chrom, "pos": req.pos}
 
         req = VariantScoreRequest(**body)
-        return _score_variant_impl(req.reference, req.alternative, req.position)
-    except HTTPException:
+        return await _score_variant_impl(req.reference, req.alternative, req.position)
+    except (HTTPException, QueueFull):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def _row_value(value):
+    """A row field as used in dedup keys: None and NaN (both ways a NULL can arrive)
+    become None, and integral floats become ints."""
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        if value.is_integer():
+            return int(value)
+    return value
+
+
+async def _variant_score_batch(rows: list) -> bytes:
+    """Encoded Snowflake response for a batch of variant rows.
+
+    Rows are deduplicated by content before anything else, so genomic windows are
+    fetched, variants scored and results encoded once per unique variant; the
+    encoded results are then fanned back out to every `row_num` in order.
+    """
+    unique, slots = {}, []
+    for row in rows:
+        # [row, reference, alternative, position] or [row, chrom, pos, ref, alt(, window)]
+        if len(row) >= 5:
+            # A missing, NULL, NaN or zero window all mean the default window.
+            window = _row_value(row[5]) if len(row) > 5 else None
+            key = ("genomic", row[1], int(row[2]), row[3], row[4], window or None)
+        else:
+            key = ("sequence", row[1], row[2], int(row[3]))
+        slots.append(unique.setdefault(key, len(unique)))
+    variant_rows["rows"] += len(rows)
+    variant_rows["deduplicated"] += len(rows) - len(unique)
+
+    keys = list(unique)
+    genomic = [i for i, key in enumerate(keys) if key[0] == "genomic"]
+    variants = [key[1:] if key[0] == "sequence" else None for key in keys]
+    for i, variant in zip(genomic, _genomic_variants([keys[i][1:] for i in genomic])):
+        variants[i] = variant
+    results = await _score_variant_rows(variants)
+    for i in genomic:
+        results[i] = {**results[i], "chrom": keys[i][1], "pos": keys[i][2]}
+
+    encoded = [_dumps(result) for result in results]
+    return b'{"data":[' + b",".join(
+        b"[" + _dumps(row[0]) + b"," + encoded[slot] + b"]" for row, slot in zip(rows, slots)
+    ) + b"]}"
+
+
+def _require_reference():
+    if not reference_genome:
+        raise HTTPException(status_code=503, detail=f"No reference genome loaded (EVO2_REFERENCE_FASTA={REFERENCE_FASTA})")
+
+
+def _variant_window(window: int) -> int:
+    """`window` if it fits both the model context and the longest loaded contig."""
+    limit = min(SCORE_WINDOW, max(length for length, *_ in reference_genome.index.values()))
+    if not 0 < window <= limit:
+        raise HTTPException(status_code=400, detail=f"window must be in [1, {limit}], got {window}")
+    return window
+
+
+def _genomic_variant(chrom: str, pos: int, ref: str, alt: str, window: int, tiled: bool = False) -> tuple:
+    """`(reference, alternative, position)` for an SNV at 1-based `pos`, with the window
+    sliced from the local reference genome. Raises ValueError for anything unscorable."""
+    ref, alt = ref.upper(), alt.upper()
+    if len(ref) != 1 or len(alt) != 1 or alt not in BASES:
+        raise ValueError(f"{chrom}:{pos} {ref}>{alt}: only SNVs are supported")
+    try:
+        if tiled:
+            reference, offset = reference_genome.tiled_window(chrom, pos, window)
+        else:
+            reference, offset = reference_genome.variant_window(chrom, pos, window)
+    except KeyError as e:
+        raise ValueError(e.args[0])
+    if reference[offset] != ref:
+        raise ValueError(f"{chrom}:{pos} ref '{ref}' does not match reference base '{reference[offset]}'")
+    return reference, reference[:offset] + alt + reference[offset + 1:], offset
+
+
+def _genomic_variants(rows: list) -> list:
+    """Resolve `(chrom, pos, ref, alt[, window])` rows, rejecting the request on the first bad row."""
+    if rows:
+        _require_reference()
+    variants = []
+    for chrom, pos, ref, alt, *rest in rows:
+        window = _variant_window(int(rest[0])) if rest and rest[0] else VARIANT_WINDOW
+        try:
+            variants.append(_genomic_variant(chrom, int(pos), ref, alt, window))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return variants
+
+
+async def _annotate_vcf_chunk(records: list, fmt: str, window: int) -> str:
+    """Score every SNV allele in a chunk of VCF records and format the annotated lines.
+    Alleles that cannot be scored (indels, ref mismatch, unknown contig) are left as '.'."""
+    variants, slots = [], []
+    for r, fields in enumerate(records):
+        for a, alt in enumerate(fields[4].split(",")):
+            try:
+                variants.append(_genomic_variant(fields[0], int(fields[1]), fields[3], alt, window, tiled=True))
+            except ValueError:
+                continue
+            slots.append((r, a))
+
+    results = await _score_variant_rows(variants, priority=PRIORITIES["score-vcf"])
+
+    annotated = [[None] * len(fields[4].split(",")) for fields in records]
+    for (r, a), result in zip(slots, results):
+        annotated[r][a] = result
+    return "".join(format_record(fields, result, fmt) for fields, result in zip(records, annotated))
+
+
+async def _annotate_vcf(lines, region_filter: RegionFilter, fmt: str, window: int):
+    """Annotated output for a VCF line stream, `VCF_CHUNK` records at a time.
+
+    The next chunk is parsed while the previous one is being scored, so at
+    most two chunks are held in memory regardless of the input size.
+    """
+    header, records, scoring = [], [], None
+    started = False
+    try:
+        async for line in lines:
+            if not line:
+                continue
+            if line.startswith("#"):
+                header.append(line)
+                continue
+            if not started:
+                started = True
+                yield output_header(header, fmt)
+            fields = line.split("\t")
+            if region_filter.match(fields[0], int(fields[1])):
+                records.append(fields)
+            if len(records) >= VCF_CHUNK:
+                if scoring:
+                    yield await scoring
+                scoring = asyncio.create_task(_annotate_vcf_chunk(records, fmt, window))
+                records = []
+        if not started:
+            yield output_header(header, fmt)
+        if scoring:
+            yield await scoring
+        if records:
+            yield await _annotate_vcf_chunk(records, fmt, window)
+    except Exception as e:
+        if scoring:
+            scoring.cancel()
+        yield f"## EVO2_ERROR={e}\n"
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse without Starlette's disconnect listener, which would consume
+    the request body chunks that the response generator is still reading."""
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+@app.post("/score-vcf")
+async def score_vcf(request: Request, regions: str = "", format: str = "vcf", window: Optional[int] = None):
+    """Annotate an uploaded VCF (plain, gzip or bgzip request body) with Evo2 variant deltas.
+
+    `regions` is a comma-separated list of `chrom`, `chrom:start-end` or gene
+    names (from `EVO2_GENES_BED`). Output streams back as VCF (EVO2_DELTA and
+    EVO2_PRED INFO fields) or TSV, one line per ALT allele.
+    """
+    _admit("score-vcf")
+    _require_reference()
+    window = VARIANT_WINDOW if window is None else _variant_window(window)
+    if format not in ("vcf", "tsv"):
+        raise HTTPException(status_code=400, detail="format must be 'vcf' or 'tsv'")
+    try:
+        region_filter = RegionFilter(regions)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return _DuplexStreamingResponse(
+        _annotate_vcf(aiter_lines(request.stream()), region_filter, format, window),
+        media_type="text/tab-separated-values" if format == "tsv" else "text/x-vcf",
+    )
+
+
+def _encode_array(arr: np.ndarray, encoding: str = "raw") -> dict:
+    """Base64 array payload: little-endian raw bytes with dtype and shape, or a `.npy` file."""
+    arr = np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder("<"))
+    if encoding == "npy":
+        buf = io.BytesIO()
+        np.save(buf, arr, allow_pickle=False)
+        data = buf.getvalue()
+    else:
+        data = arr.tobytes()
+    return {
+        "encoding": encoding,
+        "dtype": arr.dtype.name,
+        "shape": list(arr.shape),
+        "data": base64.b64encode(data).decode("ascii"),
+    }
+
+
+async def _saturation_chunk(reference: str, start: int, end: int,
+                            priority: int = PRIORITIES["saturation-scan"]) -> np.ndarray:
+    """Delta matrix (end - start) x 4 over BASES; the reference base column is NaN."""
+    deltas = np.full((end - start, len(BASES)), np.nan, dtype=np.float32)
+    substitutions = [
+        (pos, b, base) for pos in range(start, end)
+        for b, base in enumerate(BASES) if base != reference[pos]
+    ]
+    if mode == "simulated":
+        for pos, b, base in substitutions:
+            deltas[pos - start, b] = _mock_variant_delta(reference[pos], base, pos)[0]
+        return deltas
+
+    # Scored like /variant-score rows, so long references are rescored per covering window.
+    variants = [(reference[:pos] + base + reference[pos + 1:], pos) for pos, _, base in substitutions]
+    results = await _score_reference_group(reference, variants, priority)
+    for (pos, b, _), result in zip(substitutions, results):
+        deltas[pos - start, b] = result["delta_score"]
+    return deltas
+
+
+@app.post("/saturation-scan")
+async def saturation_scan(req: SaturationScanRequest):
+    _admit("saturation-scan")
+
+    end = len(req.reference) if req.end is None else req.end
+    if not 0 <= req.start < end <= len(req.reference):
+        raise HTTPException(status_code=400, detail=f"Invalid range [{req.start}, {end}) for reference of length {len(req.reference)}")
+    if req.chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size must be positive")
+
+    ref_score = await _reference_score(req.reference, PRIORITIES["saturation-scan"])
+    header = {
+        "start": req.start,
+        "end": end,
+        "bases": BASES,
+        "ref_bases": req.reference[req.start:end],
+        "ref_score": ref_score,
+    }
+
+    if req.stream:
+        async def chunks():
+            yield json.dumps(header) + "\n"
+            for chunk_start in range(req.start, end, req.chunk_size):
+                chunk_end = min(chunk_start + req.chunk_size, end)
+                deltas = await _saturation_chunk(req.reference, chunk_start, chunk_end)
+                yield json.dumps({"start": chunk_start, "end": chunk_end, "delta": _encode_array(deltas)}) + "\n"
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    deltas = await _saturation_chunk(req.reference, req.start, end)
+    return {**header, "delta": _encode_array(deltas)}
+
+
 @app.post("/generate", response_model=GenerateResponse)
 async def generate_sequence(req: GenerateRequest):
-    if not model:
-        raise HTTPException(status_code=503, detail="Model not loaded")
+    _admit("generate")
 
     if not fp8_available:
         raise HTTPException(status_code=501, detail="Generation requires FP8-capable GPU (compute capability 8.9+)")
 
     try:
-        output = model.generate(
+        output = await worker.submit(
+            model.generate,
             prompt_seqs=[req.sequence],
             n_tokens=req.n_tokens,
             temperature=req.temperature,
             top_k=req.top_k,
+            priority=PRIORITIES["generate"],
+            kind="generate",
         )
         generated = output.sequences[0]
         return GenerateResponse(
@@ -274,35 +877,299 @@ async def generate_sequence(req: GenerateRequest):
             generated=generated[len(req.sequence):],
             full_sequence=generated,
         )
+    except QueueFull:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/embeddings", response_model=EmbeddingResponse)
-async def get_embeddings(req: EmbeddingRequest):
-    if not model:
-        raise HTTPException(status_code=503, detail="Model not loaded")
+def _stream_event(fmt: str, event: str, data: dict) -> str:
+    if fmt == "ndjson":
+        return json.dumps({"event": event, **data}) + "\n"
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/generate/stream")
+async def generate_stream(req: GenerateStreamRequest, request: Request):
+    """Stream generated tokens as SSE (default) or NDJSON.
+
+    Evo2's `generate` has no per-token callback, so tokens are produced in
+    `chunk_tokens` steps, each continuing from the sequence so far. Every chunk
+    is a separate inference job, and generation stops as soon as the client
+    disconnects so GPU time is not spent on abandoned requests.
+    """
+    _admit("generate")
 
     if not fp8_available:
-        raise HTTPException(status_code=501, detail="Embeddings require FP8-capable GPU (compute capability 8.9+)")
+        raise HTTPException(status_code=501, detail="Generation requires FP8-capable GPU (compute capability 8.9+)")
+    if req.chunk_tokens < 1:
+        raise HTTPException(status_code=400, detail="chunk_tokens must be positive")
+    if req.format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'sse' or 'ndjson'")
 
-    try:
-        input_ids = torch.tensor(
-            model.tokenizer.tokenize(req.sequence),
-            dtype=torch.int,
-        ).unsqueeze(0).to("cuda:0")
+    async def events():
+        sequence = req.sequence
+        produced = 0
+        try:
+            while produced < req.n_tokens:
+                if await request.is_disconnected():
+                    print(f"Client disconnected after {produced}/{req.n_tokens} tokens, stopping generation")
+                    return
+                n = min(req.chunk_tokens, req.n_tokens - produced)
+                output = await worker.submit(
+                    model.generate,
+                    prompt_seqs=[sequence],
+                    n_tokens=n,
+                    temperature=req.temperature,
+                    top_k=req.top_k,
+                    priority=PRIORITIES["generate"],
+                    kind="generate",
+                )
+                chunk = output.sequences[0][len(sequence):]
+                if not chunk:
+                    break
+                yield _stream_event(req.format, "token", {"index": produced, "text": chunk})
+                sequence += chunk
+                produced += len(chunk)
+            yield _stream_event(req.format, "done", {
+                "prompt": req.sequence,
+                "generated": sequence[len(req.sequence):],
+                "full_sequence": sequence,
+            })
+        except Exception as e:
+            yield _stream_event(req.format, "error", {"detail": str(e)})
+
+    media_type = "text/event-stream" if req.format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+
+def _pool_batch(h: torch.Tensor, lengths: torch.Tensor, pooling: str) -> list:
+    """Pool a right-padded (batch, length, dim) tensor per sequence."""
+    if pooling == "none":
+        return [h[i, :n] for i, n in enumerate(lengths.tolist())]
+    if pooling == "cls":
+        return list(h[:, 0])
+    mask = (torch.arange(h.shape[1], device=h.device)[None, :] < lengths[:, None])[..., None]
+    if pooling == "mean":
+        return list((h * mask).sum(dim=1) / lengths[:, None].clamp(min=1))
+    if pooling == "max":
+        return list(h.masked_fill(~mask, float("-inf")).max(dim=1).values)
+    raise ValueError(f"Unknown pooling '{pooling}'")
+
+
+def _tokenize_batch(seqs: list) -> tuple:
+    """Right-padded token ids and true lengths for a batch.
+
+    Evo2 is causal, so right-padding shorter sequences does not change the
+    outputs at their real positions.
+    """
+    tokens = [model.tokenizer.tokenize(seq) for seq in seqs]
+    lengths = torch.tensor([len(t) for t in tokens])
+    input_ids = torch.full((len(seqs), int(lengths.max())), getattr(model.tokenizer, "pad_id", 1), dtype=torch.int)
+    for i, t in enumerate(tokens):
+        input_ids[i, :len(t)] = torch.tensor(t, dtype=torch.int)
+    return input_ids, lengths
+
+
+def _logprobs_batch(seqs: list, param=None) -> list:
+    """Per-position log-likelihoods (position 1 onwards) for a batch from one forward pass."""
+    input_ids, lengths = _tokenize_batch(seqs)
+    with torch.inference_mode():
+        (logits, _), _ = model(input_ids.to(model_device))
+        logprobs = torch.log_softmax(logits[:, :-1].float(), dim=-1)
+        targets = input_ids[:, 1:].long().to(logprobs.device)
+        ll = logprobs.gather(-1, targets[..., None]).squeeze(-1).cpu().numpy()
+    return [ll[i, :n - 1] for i, n in enumerate(lengths.tolist())]
+
+
+def _reduce_logprobs_batch(seqs: list, reduce_method: str) -> list:
+    """`score_sequences` built on `_logprobs_batch`, for models scored outside Evo2's GPU path."""
+    if reduce_method not in ("mean", "sum"):
+        raise ValueError(f"Unsupported reduce_method '{reduce_method}'")
+    return [float(getattr(ll, reduce_method)(dtype=np.float64)) if len(ll) else 0.0 for ll in _logprobs_batch(seqs)]
+
+
+def _embed_batch(seqs: list, param: tuple) -> list:
+    """One forward pass for a batch, returning {layer: ndarray} per sequence."""
+    layer_names, pooling = param
+    input_ids, lengths = _tokenize_batch(seqs)
 
+    with torch.inference_mode():
         _, embeddings = model(
-            input_ids,
+            input_ids.to(model_device),
             return_embeddings=True,
-            layer_names=[req.layer_name],
+            layer_names=list(layer_names),
         )
 
-        emb = embeddings[req.layer_name]
+    results = [{} for _ in seqs]
+    for layer in layer_names:
+        h = embeddings[layer].float()
+        for i, vec in enumerate(_pool_batch(h, lengths.to(h.device), pooling)):
+            results[i][layer] = vec.cpu().numpy()
+    return results
+
+
+async def _embed(sequences: list, layer_names: list, pooling: str) -> list:
+    param = (tuple(layer_names), pooling)
+    suffix = f"{model_name}:{','.join(layer_names)}:{pooling}"
+    keys = [f"{hashlib.sha256(seq.encode()).hexdigest()}:{suffix}" for seq in sequences]
+    by_key = dict(zip(keys, sequences))
+
+    async def compute(owned):
+        return await embedding_scheduler.submit_many(
+            [by_key[k] for k in owned], param, priority=PRIORITIES["embeddings"])
+
+    return await inflight.do_many(keys, compute, "embeddings")
+
+
+@app.post("/embeddings")
+async def get_embeddings(req: EmbeddingRequest):
+    """Pooled or per-token embeddings for one or more sequences and layers.
+
+    Without `pooling`, a single `sequence`/`layer_name` request keeps the original
+    summary response (`shape`, `embedding_norm`).
+    """
+    _admit("embeddings")
+
+    if mode == "simulated" and req.pooling is None:
+        raise HTTPException(status_code=501, detail="Embeddings require FP8-capable GPU (compute capability 8.9+)")
+    sequences = req.sequences or ([req.sequence] if req.sequence is not None else [])
+    if not sequences:
+        raise HTTPException(status_code=400, detail="Provide 'sequence' or 'sequences'")
+    layer_names = req.layer_names or [req.layer_name]
+    if req.pooling is None and req.layer_name not in layer_names:
+        # The summary response describes `layer_name`, so it has to be computed.
+        raise HTTPException(status_code=422, detail=f"layer_name '{req.layer_name}' must be one of layer_names")
+    pooling = req.pooling or "none"
+    if pooling not in POOLING_MODES:
+        raise HTTPException(status_code=400, detail=f"pooling must be one of {POOLING_MODES}")
+    if req.dtype not in ("float16", "float32") or req.encoding not in ("npy", "raw"):
+        raise HTTPException(status_code=400, detail="dtype must be float16/float32 and encoding npy/raw")
+
+    try:
+        results = await _embed(sequences, layer_names, pooling)
+    except QueueFull:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if pooling == "mean" and INDEX_LAYER in layer_names:
+        await _index_add(sequences, [r[INDEX_LAYER] for r in results])
+
+    if req.pooling is None:
+        emb = results[0][req.layer_name]
         return EmbeddingResponse(
             layer_name=req.layer_name,
-            shape=list(emb.shape),
-            embedding_norm=float(emb.norm()),
+            shape=[1, *emb.shape],
+            embedding_norm=float(np.linalg.norm(emb)),
         )
+
+    def encode(arr):
+        return _encode_array(np.asarray(arr, dtype=req.dtype), req.encoding)
+
+    response = {
+        "layer_names": layer_names,
+        "pooling": pooling,
+        "sequence_lengths": [len(seq) for seq in sequences],
+    }
+    if pooling == "none":
+        response["embeddings"] = [{layer: encode(r[layer]) for layer in layer_names} for r in results]
+    else:
+        response["embeddings"] = {layer: encode(np.stack([r[layer] for r in results])) for layer in layer_names}
+    return response
+
+
+def _sequence_key(sequence: str) -> str:
+    return hashlib.sha256(sequence.encode()).hexdigest()
+
+
+async def _index_add(sequences: list, vectors: list, labels: Optional[list] = None) -> int:
+    """Append mean-pooled `INDEX_LAYER` vectors to the embedding index, off the event loop."""
+    if embedding_index is None:
+        return 0
+    keys = [_sequence_key(seq) for seq in sequences]
+    return await asyncio.to_thread(
+        embedding_index.add, keys, np.stack(vectors), labels, [len(seq) for seq in sequences])
+
+
+def _require_index():
+    if embedding_index is None:
+        raise HTTPException(status_code=503, detail="Embedding index disabled")
+
+
+@app.post("/index/add")
+async def index_add(req: IndexAddRequest):
+    """Embed sequences (mean-pooled `INDEX_LAYER`) and add them to the neighbour index."""
+    _admit("embeddings")
+    _require_index()
+    if req.labels is not None and len(req.labels) != len(req.sequences):
+        raise HTTPException(status_code=400, detail="labels must match sequences in length")
+
+    try:
+        results = await _embed(req.sequences, [INDEX_LAYER], "mean")
+    except QueueFull:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    added = await _index_add(req.sequences, [r[INDEX_LAYER] for r in results], req.labels)
+    return {"added": added, "skipped": len(req.sequences) - added, "total": len(embedding_index)}
+
+
+@app.post("/neighbors")
+async def neighbors(req: NeighborsRequest):
+    """Top-k indexed sequences closest to `sequence` by cosine distance of mean-pooled embeddings."""
+    _admit("embeddings")
+    _require_index()
+
+    try:
+        vector = (await _embed([req.sequence], [INDEX_LAYER], "mean"))[0][INDEX_LAYER]
+    except QueueFull:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+    started = time.perf_counter()
+    matches = await asyncio.to_thread(embedding_index.search, vector, req.k, req.n_probe)
+    search_ms = (time.perf_counter() - started) * 1000
+    if req.add:
+        await _index_add([req.sequence], [vector], [req.label])
+    return {
+        "layer_name": INDEX_LAYER,
+        "k": req.k,
+        "matches": [
+            {"key": key, "label": label, "length": length, "distance": round(distance, 6)}
+            for key, label, length, distance in matches
+        ],
+        "indexed": len(embedding_index),
+        "search_ms": round(search_ms, 3),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Inference queue metrics in Prometheus text format."""
+    m = worker.metrics() if worker else {}
+    lines = [
+        f"evo2_queue_depth {m.get('queue_depth', 0)}",
+        f"evo2_queue_capacity {m.get('queue_capacity', 0)}",
+    ]
+    for kind, count in m.get("completed", {}).items():
+        lines.append(f'evo2_jobs_completed_total{{kind="{kind}"}} {count}')
+    for endpoint, count in m.get("rejected", {}).items():
+        lines.append(f'evo2_requests_rejected_total{{endpoint="{endpoint}"}} {count}')
+    for stage in ("wait", "service"):
+        for kind, summary in m.get(stage, {}).items():
+            lines.append(f'evo2_{stage}_ms{{kind="{kind}",stat="mean"}} {summary["mean_ms"]}')
+            lines.append(f'evo2_{stage}_ms{{kind="{kind}",stat="p95"}} {summary["p95_ms"]}')
+    coalescing = inflight.metrics()
+    for kind, count in coalescing["coalesced"].items():
+        lines.append(f'evo2_coalesced_requests_total{{kind="{kind}"}} {count}')
+    for kind, count in coalescing["owned"].items():
+        lines.append(f'evo2_owned_requests_total{{kind="{kind}"}} {count}')
+    lines.append(f"evo2_variant_rows_total {variant_rows['rows']}")
+    lines.append(f"evo2_variant_rows_deduplicated_total {variant_rows['deduplicated']}")
+    if scheduler:
+        batching = scheduler.metrics()
+        lines.append(f"evo2_batches_total {batching['batches']}")
+        lines.append(f"evo2_batched_sequences_total {batching['sequences']}")
+    return "\n".join(lines) + "\n"
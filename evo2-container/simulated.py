@@ -0,0 +1,132 @@
+import hashlib
+import os
+import time
+import zlib
+
+import numpy as np
+
+BASE_SCORE = -0.847
+SIMULATED_LATENCY_MS = float(os.getenv("EVO2_SIMULATED_LATENCY_MS", "0"))
+SIMULATED_MS_PER_KB = float(os.getenv("EVO2_SIMULATED_MS_PER_KB", "0"))
+SIMULATED_EMBEDDING_DIM = int(os.getenv("EVO2_SIMULATED_EMBEDDING_DIM", "256"))
+
+_G = ord("G")
+_BASE_CODES = np.full(256, 4, dtype=np.int64)
+for _i, _b in enumerate(b"ACGT"):
+    _BASE_CODES[_b] = _i
+    _BASE_CODES[_b + 32] = _i
+
+
+class SimulatedEvo2:
+    """Batched CPU stand-in for `Evo2.score_sequences`.
+
+    Produces exactly the scores of the per-sequence mock (GC content plus
+    SHA-256 seeded noise), but computes GC content for the whole batch over one
+    NumPy byte buffer. `latency_ms` and `ms_per_kb` add a synthetic per-batch
+    cost so batching and queueing can be load-tested at realistic service times.
+    """
+
+    def __init__(self, latency_ms=SIMULATED_LATENCY_MS, ms_per_kb=SIMULATED_MS_PER_KB,
+                 embedding_dim=SIMULATED_EMBEDDING_DIM):
+        self.latency_ms = latency_ms
+        self.ms_per_kb = ms_per_kb
+        self.embedding_dim = embedding_dim
+        self._tables = {}
+        self._logprob_table = None
+
+    def score_sequences(self, seqs, reduce_method="mean"):
+        scores = self.score_array(seqs)
+        if reduce_method == "sum":
+            # Summed over the positions of the `logprobs` track, like the real model.
+            scores = scores * np.fromiter((max(len(seq) - 1, 0) for seq in seqs), dtype=np.int64, count=len(seqs))
+        return scores.tolist()
+
+    def score_array(self, seqs) -> np.ndarray:
+        scores = self._mean_scores(seqs)
+        if self.latency_ms or self.ms_per_kb:
+            time.sleep((self.latency_ms + self.ms_per_kb * sum(map(len, seqs)) / 1024) / 1000)
+        return scores
+
+    def _mean_scores(self, seqs) -> np.ndarray:
+        if not seqs:
+            return np.empty(0, dtype=np.float64)
+        encoded = [seq.encode() for seq in seqs]
+        byte_lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        buf = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+        # 'C' (0x43) | 4 == 'G' (0x47): one compare marks both bases.
+        is_gc = (buf | 4) == _G
+        gc_counts = np.zeros(len(seqs), dtype=np.int64)
+        nonempty = byte_lengths > 0
+        if nonempty.any():
+            starts = np.cumsum(byte_lengths) - byte_lengths
+            gc_counts[nonempty] = np.add.reduceat(is_gc, starts[nonempty], dtype=np.int64)
+
+        lengths = np.fromiter((max(len(seq), 1) for seq in seqs), dtype=np.int64, count=len(seqs))
+        seeds = np.fromiter(
+            (int.from_bytes(hashlib.sha256(e).digest()[:4], "big") for e in encoded),
+            dtype=np.uint32, count=len(seqs),
+        ) / 0xFFFFFFFF
+
+        gc_content = gc_counts / lengths
+        return BASE_SCORE + (gc_content - 0.5) * 0.08 + (seeds - 0.5) * 0.04
+
+    def logprobs(self, seqs):
+        """Per-position log-likelihoods (position 1 onwards) from a fixed table over
+        each base's 3-mer left context, shifted so each track's mean is the sequence's
+        `score_array` score. A track and the score of the same sequence therefore agree;
+        a stitched windowed track, whose windows are shifted by their own scores, only
+        approximates the score of the whole sequence, as with the real model."""
+        if self._logprob_table is None:
+            rng = np.random.default_rng(zlib.crc32(b"logprobs"))
+            self._logprob_table = np.minimum(-1.386 + 0.25 * rng.standard_normal(125), -0.01).astype(np.float32)
+        results = []
+        for seq, score in zip(seqs, self._mean_scores(seqs)):
+            codes = np.concatenate(([4, 4], _BASE_CODES[np.frombuffer(seq.encode(), dtype=np.uint8)]))
+            trimers = codes[:-2] * 25 + codes[1:-1] * 5 + codes[2:]
+            track = self._logprob_table[trimers[1:]]
+            if len(track):
+                track = track + np.float32(score - track.mean(dtype=np.float64))
+            results.append(track)
+        if self.latency_ms or self.ms_per_kb:
+            time.sleep((self.latency_ms + self.ms_per_kb * sum(map(len, seqs)) / 1024) / 1000)
+        return results
+
+    def _layer_table(self, layer_name):
+        table = self._tables.get(layer_name)
+        if table is None:
+            rng = np.random.default_rng(zlib.crc32(layer_name.encode()))
+            table = rng.standard_normal((125, self.embedding_dim)).astype(np.float32)
+            self._tables[layer_name] = table
+        return table
+
+    def embed(self, seqs, layer_names, pooling="none"):
+        """Deterministic per-token embeddings from a fixed projection of each base's
+        3-mer context, so similar sequences get similar vectors. Returns one
+        {layer_name: array} per sequence, pooled like `pool_embedding`."""
+        results = []
+        for seq in seqs:
+            codes = np.concatenate(([4, 4], _BASE_CODES[np.frombuffer(seq.encode(), dtype=np.uint8)]))
+            trimers = codes[:-2] * 25 + codes[1:-1] * 5 + codes[2:]
+            results.append({
+                layer: pool_embedding(self._layer_table(layer)[trimers], pooling)
+                for layer in layer_names
+            })
+        if self.latency_ms or self.ms_per_kb:
+            time.sleep((self.latency_ms + self.ms_per_kb * sum(map(len, seqs)) / 1024) / 1000)
+        return results
+
+
+def pool_embedding(tokens: np.ndarray, pooling: str) -> np.ndarray:
+    """Pool a (length, dim) token embedding: mean, max, cls (first position) or none."""
+    if pooling == "none":
+        return tokens
+    if len(tokens) == 0:
+        return np.zeros(tokens.shape[1], dtype=tokens.dtype)
+    if pooling == "mean":
+        return tokens.mean(axis=0)
+    if pooling == "max":
+        return tokens.max(axis=0)
+    if pooling == "cls":
+        return tokens[0]
+    raise ValueError(f"Unknown pooling '{pooling}'")
@@ -0,0 +1,70 @@
+import asyncio
+from collections import defaultdict
+
+
+class SingleFlight:
+    """Coalesce concurrent identical work by key.
+
+    The first caller for a key owns the computation; callers that arrive while
+    it is in flight (or repeat the key within one call) await the same future
+    instead of computing it again. Results are not kept once the work finishes,
+    so this sits in front of the caches rather than replacing them.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.owned = defaultdict(int)
+        self.coalesced = defaultdict(int)
+
+    async def do_many(self, keys, compute, kind="score"):
+        """Results for `keys`, calling `compute(owned_keys)` (an async function returning one
+        result per key) only for keys nobody is computing yet."""
+        unique = list(dict.fromkeys(keys))
+        self.coalesced[kind] += len(keys) - len(unique)
+
+        waiting, owned = {}, []
+        for key in unique:
+            fut = self._inflight.get(key)
+            if fut is None:
+                owned.append(key)
+            else:
+                waiting[key] = fut
+                self.coalesced[kind] += 1
+
+        if owned:
+            loop = asyncio.get_running_loop()
+            futures = {key: loop.create_future() for key in owned}
+            self._inflight.update(futures)
+            self.owned[kind] += len(owned)
+            # A task, so the computation outlives an owner whose request is cancelled.
+            task = loop.create_task(compute(owned))
+            task.add_done_callback(lambda t: self._settle(t, futures))
+            waiting.update(futures)
+
+        results = await asyncio.gather(*(asyncio.shield(waiting[key]) for key in unique))
+        by_key = dict(zip(unique, results))
+        return [by_key[key] for key in keys]
+
+    def _settle(self, task, futures):
+        for key, fut in futures.items():
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+        if task.cancelled():
+            for fut in futures.values():
+                fut.cancel()
+            return
+        error = task.exception()
+        if error is not None:
+            for fut in futures.values():
+                fut.set_exception(error)
+                fut.exception()  # mark retrieved; awaiting callers still receive it
+            return
+        for fut, result in zip(futures.values(), task.result()):
+            fut.set_result(result)
+
+    def metrics(self):
+        return {
+            "in_flight": len(self._inflight),
+            "owned": dict(self.owned),
+            "coalesced": dict(self.coalesced),
+        }
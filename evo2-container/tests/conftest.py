@@ -0,0 +1,27 @@
+import functools
+import os
+import sys
+
+import pytest
+
+# The service is a set of flat modules, imported by name as in the container.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fresh_server(monkeypatch, tmp_path):
+    """`server` with its score cache under `tmp_path`, no embedding index and no GPU.
+    Every global the startup hook assigns is restored afterwards."""
+    import torch
+
+    import cache
+    import server
+
+    for name in ("model", "model_name", "mode", "model_device", "fp8_available", "worker", "scheduler",
+                 "embedding_scheduler", "logprob_scheduler", "score_cache", "embedding_index", "reference_genome"):
+        monkeypatch.setattr(server, name, getattr(server, name))
+    monkeypatch.setattr(torch.cuda, "is_available", lambda: False)
+    monkeypatch.setattr(server, "PersistentScoreCache",
+                        functools.partial(cache.PersistentScoreCache, str(tmp_path / "scores.sqlite")))
+    monkeypatch.setenv("EVO2_INDEX", "0")
+    return server
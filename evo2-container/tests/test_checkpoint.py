@@ -0,0 +1,79 @@
+import pytest
+import torch
+from torch import nn
+
+from checkpoint import layer_manifest, load_quantized, save_quantized, set_module
+
+
+class ScaledLinear(nn.Module):
+    """Stand-in for a quantized linear layer: the weight is kept as-is (so a tied weight
+    stays tied) and a per-row scale buffer is added, giving it its own state-dict layout."""
+
+    def __init__(self, weight, bias, scale):
+        super().__init__()
+        self.out_features, self.in_features = weight.shape
+        self.weight = weight
+        self.bias = bias
+        self.register_buffer("scale", scale)
+
+    def forward(self, x):
+        out = x @ (self.weight * self.scale[:, None]).t()
+        return out if self.bias is None else out + self.bias
+
+
+def make_scaled_linear(entry, tensors, device):
+    bias = nn.Parameter(tensors["bias"], requires_grad=False) if entry["bias"] else None
+    return ScaledLinear(nn.Parameter(tensors["weight"], requires_grad=False), bias, tensors["scale"])
+
+
+class TiedLM(nn.Module):
+    """Embedding, one hidden projection and an output head tied to the embedding."""
+
+    def __init__(self, head_first):
+        super().__init__()
+        if head_first:
+            self.head = nn.Linear(8, 16, bias=False)
+        self.embed = nn.Embedding(16, 8)
+        self.proj = nn.Linear(8, 8)
+        if not head_first:
+            self.head = nn.Linear(8, 16, bias=False)
+        self.head.weight = self.embed.weight
+
+    def forward(self, ids):
+        return self.head(torch.relu(self.proj(self.embed(ids))))
+
+
+def quantize(model, names):
+    for name in names:
+        linear = model.get_submodule(name)
+        scale = torch.linspace(0.5, 1.5, linear.out_features)
+        set_module(model, name, ScaledLinear(linear.weight, linear.bias, scale))
+    return model
+
+
+@pytest.mark.parametrize("head_first", [False, True])
+@pytest.mark.parametrize("replaced", [["proj"], ["proj", "head"]])
+def test_round_trip_keeps_tied_weights(tmp_path, head_first, replaced):
+    torch.manual_seed(0)
+    model = quantize(TiedLM(head_first), replaced)
+    ids = torch.randint(0, 16, (2, 5))
+    expected = model(ids)
+
+    save_quantized(model, tmp_path, {"layers": layer_manifest(model, ScaledLinear)})
+    with torch.device("meta"):
+        skeleton = quantize(TiedLM(head_first), replaced)
+    loaded, manifest = load_quantized(skeleton, tmp_path, make_scaled_linear)
+
+    assert list(manifest["aliases"].values()) == ["head.weight" if head_first else "embed.weight"]
+    assert loaded.head.weight is loaded.embed.weight
+    assert torch.equal(loaded(ids), expected)
+
+
+def test_incomplete_checkpoint_is_rejected(tmp_path):
+    model = quantize(TiedLM(False), ["proj"])
+    save_quantized(model, tmp_path, {"layers": layer_manifest(model, ScaledLinear)})
+    with torch.device("meta"):
+        skeleton = quantize(TiedLM(False), ["proj"])
+    skeleton.extra = nn.Linear(2, 2)
+    with pytest.raises(ValueError, match="missing"):
+        load_quantized(skeleton, tmp_path, make_scaled_linear)
@@ -0,0 +1,137 @@
+import os
+
+import pytest
+import torch
+from fastapi.testclient import TestClient
+from torch import nn
+
+import cpu_model
+import server
+from cpu_model import configure_threads, cpu_quota, quantize_int8
+
+
+class CharTokenizer:
+    pad_id = 1
+
+    def tokenize(self, seq):
+        return list(seq.encode())
+
+
+class TinyEvo2:
+    """Stand-in for the Evo2 wrapper: a tokenizer and a per-position model whose
+    forward returns `((logits, inference_params), embeddings)` like StripedHyena."""
+
+    def __init__(self):
+        torch.manual_seed(0)
+        self.tokenizer = CharTokenizer()
+        self.model = nn.Sequential(nn.Embedding(256, 16), nn.Linear(16, 32), nn.ReLU(), nn.Linear(32, 256))
+
+    def __call__(self, input_ids, return_embeddings=False, layer_names=None):
+        return (self.model(input_ids.long()), None), None
+
+
+def mean_logprob(evo2, sequence):
+    ids = torch.tensor([evo2.tokenizer.tokenize(sequence)])
+    with torch.inference_mode():
+        (logits, _), _ = evo2(ids)
+    logprobs = torch.log_softmax(logits[0, :-1].float(), dim=-1)
+    return logprobs.gather(-1, ids[0, 1:, None].long()).mean().item()
+
+
+def test_quantize_int8_converts_linear_layers():
+    evo2 = TinyEvo2()
+    ids = torch.randint(0, 256, (2, 12))
+    expected = evo2.model(ids)
+
+    quantized = quantize_int8(evo2.model)
+
+    linears = [m for m in quantized.modules() if isinstance(m, torch.ao.nn.quantized.dynamic.Linear)]
+    assert len(linears) == 2
+    assert all(m.weight().dtype == torch.qint8 for m in linears)
+    assert isinstance(quantized[0], nn.Embedding)
+    assert torch.allclose(quantized(ids), expected, atol=0.05)
+
+
+@pytest.fixture
+def eight_cpus(monkeypatch):
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: set(range(8)), raising=False)
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+@pytest.mark.parametrize("cpu_max, expected", [
+    ("200000 100000\n", 2),
+    ("150000 100000\n", 2),
+    ("50000 100000\n", 1),
+    ("1600000 100000\n", 8),
+    ("max 100000\n", 8),
+])
+def test_cpu_quota_cgroup_v2(tmp_path, eight_cpus, cpu_max, expected):
+    write(tmp_path / "cpu.max", cpu_max)
+    assert cpu_quota(str(tmp_path)) == expected
+
+
+@pytest.mark.parametrize("quota, expected", [("300000", 3), ("-1", 8)])
+def test_cpu_quota_cgroup_v1(tmp_path, eight_cpus, quota, expected):
+    write(tmp_path / "cpu" / "cpu.cfs_quota_us", quota + "\n")
+    write(tmp_path / "cpu" / "cpu.cfs_period_us", "100000\n")
+    assert cpu_quota(str(tmp_path)) == expected
+
+
+def test_cpu_quota_without_cgroup_uses_affinity(tmp_path, eight_cpus):
+    assert cpu_quota(str(tmp_path)) == 8
+
+
+def test_configure_threads_sizes_pool_from_quota(monkeypatch):
+    previous = torch.get_num_threads()
+    monkeypatch.setattr(cpu_model, "cpu_quota", lambda: 3)
+    try:
+        assert configure_threads(0) == 3
+        assert torch.get_num_threads() == 3
+        assert configure_threads(2) == 2
+        assert torch.get_num_threads() == 2
+    finally:
+        torch.set_num_threads(previous)
+
+
+@pytest.fixture
+def cpu_server(monkeypatch, fresh_server):
+    """`server` configured for CPU mode; `start(load)` uses `load` as the model loader."""
+    monkeypatch.setattr(server, "CPU_MODEL", "evo2_tiny")
+
+    def start(load):
+        monkeypatch.setattr(cpu_model, "load_evo2_cpu_int8", load)
+        return TestClient(server.app)
+
+    return start
+
+
+def test_startup_loads_cpu_model(cpu_server):
+    evo2 = TinyEvo2()
+    evo2.model = quantize_int8(evo2.model)
+
+    with cpu_server(lambda name: evo2) as client:
+        health = client.get("/health").json()
+        assert (health["mode"], health["model"]) == ("cpu", "evo2_tiny")
+        assert server.score_cache.namespace == "cpu"
+
+        response = client.post("/score", json={"sequence": "ACGTTGCAAC"})
+        assert response.status_code == 200
+        assert response.json()["score"] == pytest.approx(mean_logprob(evo2, "ACGTTGCAAC"), abs=1e-5)
+
+        response = client.post("/embeddings", json={"sequence": "ACGT", "layer_names": ["blocks.0.mlp.l3"]})
+        assert response.status_code == 422
+
+
+def test_startup_falls_back_to_simulated(cpu_server):
+    def load(name):
+        raise RuntimeError("no checkpoint")
+
+    with cpu_server(load) as client:
+        health = client.get("/health").json()
+        assert (health["mode"], health["model"]) == ("simulated", None)
+        assert server.score_cache.namespace == "simulated"
+        assert client.post("/score", json={"sequence": "ACGTTGCAAC"}).status_code == 200
@@ -0,0 +1,23 @@
+import pytest
+from fastapi.testclient import TestClient
+
+SEQUENCE = "ACGTTGCAACGGATCCATGCATTAGCCGATAGGCTTACGATCGGACTTAGC" * 4
+
+
+@pytest.fixture
+def client(monkeypatch, fresh_server):
+    monkeypatch.setattr(fresh_server, "CPU_MODEL", "")
+    with TestClient(fresh_server.app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("reduce_method", ["mean", "sum"])
+def test_score_does_not_depend_on_track_output(client, reduce_method):
+    def score(**options):
+        response = client.post("/score", json={"sequence": SEQUENCE, "reduce_method": reduce_method, **options})
+        assert response.status_code == 200
+        return response.json()["score"]
+
+    plain = score()
+    assert score(return_track=True) == pytest.approx(plain, rel=1e-6)
+    assert score(ranges=[[0, 10]]) == pytest.approx(plain, rel=1e-6)
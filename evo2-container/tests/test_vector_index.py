@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+
+from vector_index import EmbeddingIndex
+
+
+def vectors(n, seed):
+    return np.random.default_rng(seed).standard_normal((n, 16)).astype(np.float32)
+
+
+def keys(start, n):
+    return [f"seq-{i}" for i in range(start, start + n)]
+
+
+def test_inserts_append_assignments_without_rewriting_ivf(tmp_path):
+    index = EmbeddingIndex(str(tmp_path), min_train=64)
+    index.add(keys(0, 100), vectors(100, 0))
+    ivf_path = tmp_path / "ivf.npz"
+    trained = ivf_path.read_bytes()
+
+    for i in range(100, 140, 10):
+        index.add(keys(i, 10), vectors(10, i))
+
+    assert ivf_path.read_bytes() == trained
+    assert os.path.getsize(tmp_path / "ivf_assign.i32") == 40 * 2 * 4
+
+    reopened = EmbeddingIndex(str(tmp_path), min_train=64)
+    assert np.array_equal(reopened._assign, index._assign)
+    query = vectors(1, 999)[0]
+    assert reopened.search(query, k=5) == index.search(query, k=5)
+
+
+def test_save_ivf_folds_log_into_snapshot(tmp_path):
+    index = EmbeddingIndex(str(tmp_path), min_train=64)
+    index.add(keys(0, 100), vectors(100, 0))
+    index.add(keys(100, 20), vectors(20, 1))
+    log = (tmp_path / "ivf_assign.i32").read_bytes()
+
+    index.save_ivf()
+    assert os.path.getsize(tmp_path / "ivf_assign.i32") == 0
+
+    # A stale log left by a crash right after the snapshot is ignored.
+    (tmp_path / "ivf_assign.i32").write_bytes(log)
+    reopened = EmbeddingIndex(str(tmp_path), min_train=64)
+    assert np.array_equal(reopened._assign, index._assign)
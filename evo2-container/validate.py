@@ -43,7 +43,7 @@ except SyntaxError as e:
     print(f"FAIL: Syntax error in quantize.py: {e}")
     sys.exit(1)
 
-expected = ["GET /health", "POST /score", "POST /generate", "POST /embeddings", "POST /variant-score"]
+expected = ["GET /health", "POST /score", "POST /generate", "POST /embeddings", "POST /variant-score", "POST /saturation-scan", "POST /generate/stream", "POST /neighbors", "POST /index/add", "POST /score-vcf"]
 for ep in expected:
     if ep in endpoints:
         print(f"  ✓ {ep}")
@@ -0,0 +1,135 @@
+import os
+import zlib
+
+VCF_CHUNK = int(os.getenv("EVO2_VCF_CHUNK", "512"))
+GENES_BED = os.getenv("EVO2_GENES_BED", "")
+
+VCF_INFO_HEADER = [
+    '##INFO=<ID=EVO2_DELTA,Number=A,Type=Float,Description="Evo2 alt minus ref log-likelihood score">',
+    '##INFO=<ID=EVO2_PRED,Number=A,Type=String,Description="Evo2 variant effect prediction">',
+]
+TSV_COLUMNS = ["CHROM", "POS", "ID", "REF", "ALT", "EVO2_REF_SCORE", "EVO2_ALT_SCORE", "EVO2_DELTA", "EVO2_PRED"]
+
+
+def _contig(chrom: str) -> str:
+    return chrom[3:] if chrom.startswith("chr") else chrom
+
+
+def load_gene_bed(path: str) -> dict:
+    """Gene name -> (chrom, start, end) from a BED file with a name column (0-based, half-open)."""
+    genes = {}
+    with open(path) as f:
+        for line in f:
+            if not line.strip() or line.startswith(("#", "track", "browser")):
+                continue
+            chrom, start, end, name = line.split("\t")[:4]
+            genes[name.strip().upper()] = (chrom, int(start), int(end))
+    return genes
+
+
+class RegionFilter:
+    """Match VCF records against `chrom`, `chrom:start-end` (1-based, inclusive) or gene names.
+
+    Gene names are resolved through `EVO2_GENES_BED`. An empty filter matches
+    everything. Contig names match with or without a `chr` prefix.
+    """
+
+    def __init__(self, spec: str = "", genes_bed: str = GENES_BED):
+        self.regions = {}
+        genes = None
+        for item in (part.strip() for part in (spec or "").split(",")):
+            if not item:
+                continue
+            if ":" in item:
+                chrom, span = item.rsplit(":", 1)
+                start, end = span.split("-")
+                self._add(chrom, int(start) - 1, int(end))
+                continue
+            if genes is None:
+                genes = self._genes(genes_bed)
+            if item.upper() in genes:
+                self._add(*genes[item.upper()])
+            elif item.isalnum() and (item[:3] == "chr" or len(item) <= 2):
+                self._add(item, 0, float("inf"))
+            else:
+                raise ValueError(f"Unknown region or gene '{item}'")
+
+    @staticmethod
+    def _genes(path):
+        return load_gene_bed(path) if path and os.path.exists(path) else {}
+
+    def _add(self, chrom, start, end):
+        self.regions.setdefault(_contig(chrom), []).append((start, end))
+
+    def __bool__(self):
+        return bool(self.regions)
+
+    def match(self, chrom: str, pos: int) -> bool:
+        if not self.regions:
+            return True
+        spans = self.regions.get(_contig(chrom))
+        return spans is not None and any(start < pos <= end for start, end in spans)
+
+
+async def aiter_lines(chunks):
+    """Decode text lines from an async byte stream, gunzipping plain gzip or
+    multi-member (bgzip) input as it arrives. Only one chunk is held at a time."""
+    decomp = None
+    pending = b""
+    first = True
+    async for chunk in chunks:
+        if first and chunk:
+            first = False
+            if chunk[:2] == b"\x1f\x8b":
+                decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if decomp is not None:
+            data = b""
+            while chunk:
+                data += decomp.decompress(chunk)
+                chunk = decomp.unused_data
+                if chunk:
+                    decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            chunk = data
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r").decode()
+    if pending:
+        yield pending.rstrip(b"\r").decode()
+
+
+def output_header(header: list, fmt: str) -> str:
+    if fmt == "tsv":
+        return "\t".join(TSV_COLUMNS) + "\n"
+    meta = [line for line in header if line.startswith("##")]
+    columns = [line for line in header if not line.startswith("##")]
+    if not meta:
+        meta = ["##fileformat=VCFv4.2"]
+    if not columns:
+        columns = ["#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO"]
+    return "\n".join(meta + VCF_INFO_HEADER + columns) + "\n"
+
+
+def _fmt(value) -> str:
+    return "." if value is None else f"{value:.6f}"
+
+
+def format_record(fields: list, results: list, fmt: str) -> str:
+    """Annotated output line(s) for one VCF record; `results` holds one scored dict or
+    `None` per ALT allele."""
+    if fmt == "tsv":
+        return "".join(
+            "\t".join([*fields[:4], alt,
+                       _fmt(r and r["ref_score"]), _fmt(r and r["alt_score"]), _fmt(r and r["delta_score"]),
+                       r["prediction"] if r else "."]) + "\n"
+            for alt, r in zip(fields[4].split(","), results)
+        )
+    while len(fields) < 8:
+        fields.append(".")
+    annotation = (
+        "EVO2_DELTA=" + ",".join(_fmt(r and r["delta_score"]) for r in results)
+        + ";EVO2_PRED=" + ",".join(r["prediction"].replace(" ", "_") if r else "." for r in results)
+    )
+    info = fields[7]
+    fields[7] = annotation if info in ("", ".") else f"{info};{annotation}"
+    return "\t".join(fields) + "\n"
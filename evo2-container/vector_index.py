@@ -0,0 +1,269 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+INDEX_PATH = os.getenv("EVO2_INDEX_PATH", "/models/evo2_index")
+INDEX_MIN_TRAIN = int(os.getenv("EVO2_INDEX_MIN_TRAIN", "1024"))
+INDEX_N_PROBE = int(os.getenv("EVO2_INDEX_N_PROBE", "8"))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _kmeans(data: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means (Lloyd) on unit vectors; returns unit centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        empty = np.bincount(assign, minlength=k) == 0
+        sums[empty] = data[rng.choice(len(data), size=int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class EmbeddingIndex:
+    """Append-only store of pooled embeddings keyed by sequence digest, with an IVF index.
+
+    Vectors are unit-normalized and compared by cosine distance. Below
+    `min_train` vectors search is exact; after that an inverted-file index with
+    ~sqrt(N) lists is trained by k-means, new vectors are assigned to their
+    nearest list as they arrive, and lists are retrained when the store doubles.
+
+    On disk (`path/`): `meta.json` (dim), `vectors.f32` (raw float32 rows,
+    appended in place), `keys.jsonl` (one `{"key", "label", "length"}` per row),
+    `ivf.npz` (centroids and row assignments, written on train and `save_ivf`)
+    and `ivf_assign.i32` (int32 `(row, list)` pairs appended for rows assigned
+    since, so an insert does not rewrite every assignment). Vectors are
+    memory-mapped on load. `add` and `search` are serialized by a lock so they can run off the
+    event loop.
+    """
+
+    def __init__(self, path=INDEX_PATH, min_train=INDEX_MIN_TRAIN, n_probe=INDEX_N_PROBE):
+        self.path = path
+        self.min_train = min_train
+        self.n_probe = n_probe
+        self.dim = None
+        self.keys = []
+        self.labels = []
+        self.lengths = []
+        self._row = {}
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._size = 0
+        self.centroids = None
+        self._assign = np.empty(0, dtype=np.int32)
+        self._lists = []
+        self._list_arrays = {}
+        self._trained_at = 0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, key):
+        return key in self._row
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self._size]
+
+    def _load(self):
+        meta_path = os.path.join(self.path, "meta.json")
+        keys_path = os.path.join(self.path, "keys.jsonl")
+        vec_path = os.path.join(self.path, "vectors.f32")
+        if not all(os.path.exists(p) for p in (meta_path, keys_path, vec_path)):
+            return
+        with open(meta_path) as f:
+            self.dim = json.load(f)["dim"]
+        with open(keys_path) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        # A crash between the two appends leaves one file longer; keep the common prefix.
+        n = min(len(rows), os.path.getsize(vec_path) // (4 * self.dim))
+        rows = rows[:n]
+        if not rows:
+            self._vectors = np.empty((0, self.dim), dtype=np.float32)
+            return
+        mapped = np.memmap(vec_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+        self._vectors = mapped
+        self._size = n
+        for i, row in enumerate(rows):
+            self.keys.append(row["key"])
+            self.labels.append(row.get("label"))
+            self.lengths.append(row.get("length"))
+            self._row[row["key"]] = i
+
+        ivf_path = os.path.join(self.path, "ivf.npz")
+        if os.path.exists(ivf_path):
+            ivf = np.load(ivf_path)
+            self.centroids = ivf["centroids"]
+            assign = self._replay_assignments(ivf["assign"][:n], n)
+            self._trained_at = int(ivf["trained_at"])
+            self._set_lists(assign)
+            if len(assign) < n:
+                self._assign_new(n - len(assign))
+        elif n >= self.min_train:
+            self.train()
+
+    def _replay_assignments(self, assign, n):
+        """`assign` extended by the logged assignments of the rows after it. Pairs for
+        rows `assign` already covers predate the last `save_ivf` and are ignored."""
+        path = os.path.join(self.path, "ivf_assign.i32")
+        if not os.path.exists(path):
+            return assign
+        log = np.fromfile(path, dtype=np.int32)
+        log = log[:len(log) // 2 * 2].reshape(-1, 2)  # drop a torn final write
+        log = log[(log[:, 0] >= len(assign)) & (log[:, 0] < n)]
+        extra = np.full(n - len(assign), -1, dtype=np.int32)
+        extra[log[:, 0] - len(assign)] = log[:, 1]
+        known = len(extra) if (extra >= 0).all() else int(np.argmax(extra < 0))
+        return np.concatenate([assign, extra[:known]])
+
+    def _grow(self, extra: int):
+        needed = self._size + extra
+        if needed <= len(self._vectors) and not isinstance(self._vectors, np.memmap):
+            return
+        capacity = max(needed, 2 * len(self._vectors), 1024)
+        grown = np.empty((capacity, self.dim), dtype=np.float32)
+        grown[:self._size] = self._vectors[:self._size]
+        self._vectors = grown
+
+    def add(self, keys, vectors, labels=None, lengths=None) -> int:
+        """Append vectors whose keys are new; returns how many were added."""
+        with self._lock:
+            return self._add(keys, vectors, labels, lengths)
+
+    def _add(self, keys, vectors, labels, lengths) -> int:
+        vectors = _normalize(np.atleast_2d(vectors))
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._vectors = np.empty((0, self.dim), dtype=np.float32)
+            with open(os.path.join(self.path, "meta.json"), "w") as f:
+                json.dump({"dim": self.dim}, f)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Vector dim {vectors.shape[1]} does not match index dim {self.dim}")
+
+        labels = labels or [None] * len(keys)
+        lengths = lengths or [None] * len(keys)
+        fresh, seen = [], set()
+        for i, key in enumerate(keys):
+            if key not in self._row and key not in seen:
+                fresh.append(i)
+                seen.add(key)
+        if not fresh:
+            return 0
+
+        self._grow(len(fresh))
+        start = self._size
+        self._vectors[start:start + len(fresh)] = vectors[fresh]
+        with open(os.path.join(self.path, "vectors.f32"), "ab") as f:
+            f.write(vectors[fresh].tobytes())
+        with open(os.path.join(self.path, "keys.jsonl"), "a") as f:
+            for i in fresh:
+                f.write(json.dumps({"key": keys[i], "label": labels[i], "length": lengths[i]}) + "\n")
+        for offset, i in enumerate(fresh):
+            self._row[keys[i]] = start + offset
+            self.keys.append(keys[i])
+            self.labels.append(labels[i])
+            self.lengths.append(lengths[i])
+        self._size += len(fresh)
+
+        if self.centroids is None:
+            if self._size >= self.min_train:
+                self.train()
+        elif self._size >= 2 * self._trained_at:
+            self.train()
+        else:
+            self._assign_new(len(fresh))
+        return len(fresh)
+
+    def train(self):
+        data = np.asarray(self.vectors)
+        n_lists = max(1, int(np.sqrt(len(data))))
+        sample = data if len(data) <= 50 * n_lists else \
+            data[np.random.default_rng(0).choice(len(data), size=50 * n_lists, replace=False)]
+        self.centroids = _kmeans(sample, n_lists)
+        self._trained_at = len(data)
+        self._set_lists(np.empty(0, dtype=np.int32))
+        self._assign_rows(len(data))
+        self.save_ivf()
+
+    def _set_lists(self, assign):
+        self._assign = np.asarray(assign, dtype=np.int32)
+        self._lists = [[] for _ in range(len(self.centroids))]
+        for row, c in enumerate(self._assign.tolist()):
+            self._lists[c].append(row)
+        self._list_arrays = {}
+
+    def _assign_rows(self, count: int) -> np.ndarray:
+        start = self._size - count
+        new = np.argmax(np.asarray(self.vectors[start:]) @ self.centroids.T, axis=1).astype(np.int32)
+        self._assign = np.concatenate([self._assign, new])
+        for offset, c in enumerate(new.tolist()):
+            self._lists[c].append(start + offset)
+            self._list_arrays.pop(c, None)
+        return new
+
+    def _assign_new(self, count: int):
+        """Assign the last `count` rows to their nearest lists and log the assignments."""
+        new = self._assign_rows(count)
+        rows = np.arange(self._size - count, self._size, dtype=np.int32)
+        with open(os.path.join(self.path, "ivf_assign.i32"), "ab") as f:
+            f.write(np.stack([rows, new], axis=1).tobytes())
+
+    def save_ivf(self):
+        """Write centroids and every assignment to `ivf.npz`, then clear the assignment log."""
+        if self.centroids is None:
+            return
+        tmp = os.path.join(self.path, "ivf.tmp.npz")
+        np.savez(tmp, centroids=self.centroids, assign=self._assign, trained_at=self._trained_at)
+        os.replace(tmp, os.path.join(self.path, "ivf.npz"))
+        open(os.path.join(self.path, "ivf_assign.i32"), "wb").close()
+
+    def _candidates(self, query: np.ndarray, n_probe: int) -> np.ndarray:
+        if self.centroids is None:
+            return np.arange(self._size)
+        probe = np.argsort(-(self.centroids @ query))[:n_probe]
+        lists = []
+        for c in probe.tolist():
+            arr = self._list_arrays.get(c)
+            if arr is None:
+                arr = self._list_arrays[c] = np.asarray(self._lists[c], dtype=np.int64)
+            lists.append(arr)
+        return np.concatenate(lists) if lists else np.empty(0, dtype=np.int64)
+
+    def search(self, query, k=10, n_probe=None):
+        """Top-k rows by cosine distance: list of (key, label, length, distance)."""
+        with self._lock:
+            return self._search(query, k, n_probe)
+
+    def _search(self, query, k, n_probe):
+        if self._size == 0:
+            return []
+        query = _normalize(query).reshape(-1)
+        rows = self._candidates(query, n_probe or self.n_probe)
+        distances = 1.0 - np.asarray(self.vectors[rows]) @ query
+        top = np.argpartition(distances, min(k, len(rows)) - 1)[:k] if len(rows) > k else np.arange(len(rows))
+        top = top[np.argsort(distances[top])]
+        return [
+            (self.keys[r], self.labels[r], self.lengths[r], float(distances[t]))
+            for r, t in zip(rows[top].tolist(), top.tolist())
+        ]
+
+    def metrics(self):
+        return {
+            "path": self.path,
+            "vectors": self._size,
+            "dim": self.dim,
+            "lists": 0 if self.centroids is None else len(self.centroids),
+            "trained_at": self._trained_at,
+            "n_probe": self.n_probe,
+        }
@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+
+SCORE_WINDOW = int(os.getenv("EVO2_SCORE_WINDOW", "8192"))
+WINDOW_OVERLAP = int(os.getenv("EVO2_WINDOW_OVERLAP", "1024"))
+
+WINDOW_REDUCTIONS = ("mean", "sum", "min", "max")
+
+
+def plan_windows(length: int, window: int, overlap: int) -> list:
+    """Overlapping `(start, end)` windows covering `[0, length)`, stepping by `window - overlap`.
+
+    The last window is aligned to the end of the sequence, so every window is
+    full length once the sequence is longer than `window`.
+    """
+    if not 0 <= overlap < window:
+        raise ValueError(f"overlap must be in [0, window), got overlap={overlap}, window={window}")
+    if length <= window:
+        return [(0, length)]
+    stride = window - overlap
+    starts = list(range(0, length - window, stride)) + [length - window]
+    return [(s, s + window) for s in starts]
+
+
+def contributions(windows: list) -> list:
+    """Positions `[lo, hi)` each window's track supplies to the stitched track.
+
+    A causal model sees the most left context for a position in the earliest
+    window containing it, so each window contributes from where the previous
+    one ended; its leading overlap only serves as context. Position 0 has no
+    prediction.
+    """
+    spans = []
+    lo = 1
+    for _, end in windows:
+        spans.append((lo, end))
+        lo = max(lo, end)
+    return spans
+
+
+def stitch(length: int, windows: list, tracks: list) -> np.ndarray:
+    """Join per-window log-likelihood tracks into one track over positions `1..length-1`.
+
+    `tracks[k][j]` is the log-likelihood of position `windows[k][0] + j + 1`;
+    element `p - 1` of the result is that of position `p`.
+    """
+    out = np.empty(max(length - 1, 0), dtype=np.float32)
+    for (start, _), (lo, hi), track in zip(windows, contributions(windows), tracks):
+        out[lo - 1:hi - 1] = track[lo - start - 1:hi - start - 1]
+    return out
+
+
+def covering(windows: list, position: int) -> list:
+    """Indices of the windows containing `position`: the only ones a substitution there changes."""
+    return [k for k, (start, end) in enumerate(windows) if start <= position < end]
+
+
+def reduce_track(track: np.ndarray, reduce_method: str) -> float:
+    if reduce_method not in WINDOW_REDUCTIONS:
+        raise ValueError(f"reduce_method must be one of {WINDOW_REDUCTIONS}")
+    if len(track) == 0:
+        return 0.0
+    fn = getattr(np, reduce_method)
+    return float(fn(track, dtype=np.float64) if reduce_method in ("mean", "sum") else fn(track))
+
+
+def reduce_patched(track: np.ndarray, total: float, patches: list, reduce_method: str) -> float:
+    """Reduce `track` with `(lo, values)` patches applied, without copying it for mean/sum.
+
+    `total` is the float64 sum of the unpatched track.
+    """
+    if reduce_method in ("mean", "sum"):
+        for lo, values in patches:
+            total += float(np.sum(values, dtype=np.float64) - np.sum(track[lo:lo + len(values)], dtype=np.float64))
+        return total / max(len(track), 1) if reduce_method == "mean" else total
+    patched = track.copy()
+    for lo, values in patches:
+        patched[lo:lo + len(values)] = values
+    return reduce_track(patched, reduce_method)
+
+
+def range_reductions(track: np.ndarray, ranges: list) -> list:
+    """mean, sum, min and max of `track` over each sequence range `[start, end)`.
+
+    Ranges use sequence positions, like `stitch`: position 0 has no prediction,
+    so `[0, end)` covers the same values as `[1, end)`. Sums come from a single
+    float64 prefix sum, so any number of ranges reuses the one track.
+    """
+    prefix = np.concatenate(([0.0], np.cumsum(track, dtype=np.float64)))
+    results = []
+    for start, end in ranges:
+        lo, hi = max(start, 1) - 1, max(end - 1, 0)
+        n = max(hi - lo, 0)
+        total = float(prefix[lo + n] - prefix[lo])
+        values = track[lo:lo + n]
+        results.append({
+            "start": start,
+            "end": end,
+            "mean": total / n if n else 0.0,
+            "sum": total,
+            "min": float(values.min()) if n else 0.0,
+            "max": float(values.max()) if n else 0.0,
+        })
+    return results
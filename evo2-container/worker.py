@@ -0,0 +1,162 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+
+INFERENCE_QUEUE_SIZE = int(os.getenv("EVO2_INFERENCE_QUEUE_SIZE", "64"))
+
+# Lower runs first. Interactive variant lookups beat bulk scans and generation.
+PRIORITIES = {
+    "variant-score": 0,
+    "score": 1,
+    "embeddings": 2,
+    "saturation-scan": 3,
+    "score-vcf": 3,
+    "generate": 4,
+}
+
+# Fraction of the queue each priority may fill before new requests are turned away,
+# so bulk traffic is shed before interactive traffic.
+ADMIT_FRACTION = {0: 1.0, 1: 0.9, 2: 0.75, 3: 0.5, 4: 0.5}
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InferenceWorker:
+    """Runs model calls on one dedicated thread, fed by a bounded priority queue.
+
+    Keeps blocking inference off the event loop so `/health` and request
+    parsing stay responsive while the GPU is busy. Requests are admitted once,
+    up front (`admit`); the batches an admitted request then submits wait for a
+    free queue slot rather than failing, however many it needs. Freed slots go
+    to the most urgent waiting batch.
+    """
+
+    def __init__(self, max_queue=INFERENCE_QUEUE_SIZE, name="evo2-inference"):
+        self.max_queue = max_queue
+        # Slots are accounted on the event loop (`_used`, `_waiters`), so the queue
+        # itself never rejects a put.
+        self._queue = queue.PriorityQueue()
+        self._used = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._wait = defaultdict(lambda: deque(maxlen=1024))
+        self._service = defaultdict(lambda: deque(maxlen=1024))
+        self.completed = defaultdict(int)
+        self.rejected = defaultdict(int)
+        self.busy = False
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def retry_after(self) -> int:
+        with self._stats_lock:
+            recent = [t for times in self._service.values() for t in times]
+        mean_service = sum(recent) / len(recent) if recent else 0.1
+        return max(1, round((self._queue.qsize() + 1) * mean_service))
+
+    def admit(self, endpoint: str):
+        """Reject a new request up front when the queue is past this endpoint's share."""
+        limit = self.max_queue * ADMIT_FRACTION[PRIORITIES[endpoint]]
+        if self._queue.qsize() >= limit:
+            self.rejected[endpoint] += 1
+            raise QueueFull(self.retry_after())
+
+    async def submit(self, fn, *args, priority=1, kind="score_batch", **kwargs):
+        loop = asyncio.get_running_loop()
+        await self._acquire(priority, loop)
+        fut = loop.create_future()
+        self._queue.put_nowait((priority, next(self._seq), time.perf_counter(), kind, fn, args, kwargs, fut, loop))
+        return await fut
+
+    async def _acquire(self, priority, loop):
+        """Take a queue slot, waiting behind more urgent (then earlier) waiters when full."""
+        if self._used < self.max_queue and not self._waiters:
+            self._used += 1
+            return
+        slot = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), slot))
+        try:
+            await slot
+        except asyncio.CancelledError:
+            if slot.done() and not slot.cancelled():
+                self._release()  # handed a slot we no longer need
+            raise
+
+    def _release(self):
+        """Pass a freed slot to the most urgent live waiter, or return it to the pool."""
+        while self._waiters:
+            _, _, slot = heapq.heappop(self._waiters)
+            if not slot.done():
+                slot.set_result(None)
+                return
+        self._used -= 1
+
+    def _run(self):
+        while True:
+            _, _, enqueued, kind, fn, args, kwargs, fut, loop = self._queue.get()
+            loop.call_soon_threadsafe(self._release)
+            if fut.cancelled():
+                continue
+            started = time.perf_counter()
+            self.busy = True
+            try:
+                result, error = fn(*args, **kwargs), None
+            except Exception as e:
+                result, error = None, e
+            finally:
+                self.busy = False
+            finished = time.perf_counter()
+            with self._stats_lock:
+                self._wait[kind].append(started - enqueued)
+                self._service[kind].append(finished - started)
+                self.completed[kind] += 1
+            loop.call_soon_threadsafe(_resolve, fut, result, error)
+
+    def reset_metrics(self):
+        """Clear wait/service samples and counters, e.g. between benchmark runs."""
+        with self._stats_lock:
+            self._wait.clear()
+            self._service.clear()
+            self.completed.clear()
+            self.rejected.clear()
+
+    def metrics(self):
+        def summary(times):
+            ordered = sorted(times)
+            if not ordered:
+                return {"mean_ms": 0.0, "p95_ms": 0.0}
+            return {
+                "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+                "p95_ms": round(ordered[math.ceil(0.95 * len(ordered)) - 1] * 1000, 3),
+            }
+
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self.max_queue,
+                "waiting": len(self._waiters),
+                "busy": self.busy,
+                "completed": dict(self.completed),
+                "rejected": dict(self.rejected),
+                "wait": {kind: summary(times) for kind, times in self._wait.items()},
+                "service": {kind: summary(times) for kind, times in self._service.items()},
+            }
+
+
+def _resolve(fut, result, error):
+    if fut.done():
+        return
+    if error is not None:
+        fut.set_exception(error)
+    else:
+        fut.set_result(result)
@@ -3,9 +3,16 @@ import sys
 import json
 import random
 import uuid
+import argparse
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date, datetime, timedelta
 from collections import defaultdict
 
+import numpy as np
+
+from population_store import DEFAULT_FORMAT, FORMATS, discard_sharded, shard_dir, write_manifest, write_shard
+
 random.seed(42)
 
 N_PAIRS = 1000
@@ -107,25 +114,32 @@ def weighted_choice(items_with_weights):
     return items_with_weights[-1][0], items_with_weights[-1][1]
 
 
+COUNTY_CUM_POP = np.cumsum([c[2] for c in COUNTIES])
+
+
 def pick_county():
-    total_pop = sum(c[2] for c in COUNTIES)
-    r = random.uniform(0, total_pop)
-    cum = 0
-    for name, fips, pop, svi in COUNTIES:
-        cum += pop
-        if r <= cum:
-            return {"name": name, "fips": fips, "svi": svi}
-    return {"name": COUNTIES[-1][0], "fips": COUNTIES[-1][1], "svi": COUNTIES[-1][3]}
+    r = random.uniform(0, COUNTY_CUM_POP[-1])
+    name, fips, _, svi = COUNTIES[min(bisect_left(COUNTY_CUM_POP, r), len(COUNTIES) - 1)]
+    return {"name": name, "fips": fips, "svi": svi}
+
+
+def n_deaths(n_pairs):
+    return max(1, round(n_pairs * MORTALITY_RATE))
 
 
-def generate_base_population():
+def mother_id_base(n_pairs):
+    # Mother ids start at 300000 unless infant ids (200000 + i) would reach them.
+    return max(300000, 200000 + n_pairs)
+
+
+def generate_base_population(n_pairs=N_PAIRS):
     pairs = []
-    death_indices = set(random.sample(range(N_PAIRS), N_DEATHS))
+    death_indices = set(random.sample(range(n_pairs), n_deaths(n_pairs)))
 
-    for i in range(N_PAIRS):
+    for i in range(n_pairs):
         county = pick_county()
         infant_id = 200000 + i
-        mother_id = 300000 + i
+        mother_id = mother_id_base(n_pairs) + i
         mrn_infant = f"MS-INF-{infant_id}"
         mrn_mother = f"MS-MAT-{mother_id}"
 
@@ -282,9 +296,386 @@ def generate_base_population():
     return pairs
 
 
+RACE_CUM = np.cumsum([r[2] for r in RACE_DIST]) / sum(r[2] for r in RACE_DIST)
+GENDER_CUM = np.cumsum([g[2] for g in GENDER_DIST]) / sum(g[2] for g in GENDER_DIST)
+INSURANCE_TYPES = ["medicaid", "private", "uninsured"]
+INSURANCE_CUM = np.cumsum([0.596, 0.334, 0.05]) / (0.596 + 0.334 + 0.05)
+DEATH_DAY_RANGES = np.array([[0, 28], [29, 90], [91, 365]])
+DEATH_DAY_CUM = np.cumsum([0.5, 0.3, 0.2])
+MATERNAL_KEYS = list(MATERNAL_CONDITIONS)
+MATERNAL_RATES = np.array([c["rate"] for c in MATERNAL_CONDITIONS.values()])
+INFANT_KEYS = list(INFANT_CONDITIONS)
+INFANT_RATES = np.array([c["rate"] for c in INFANT_CONDITIONS.values()])
+# Weigh-ins are at least 14 days apart, so a year holds at most this many.
+MAX_WEIGH_INS = 365 // 14 + 1
+SHARD_SIZE = 100_000
+HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+UUID_HEX_COLUMNS = [i for i in range(36) if i not in (8, 13, 18, 23)]
+
+
+def _pick(rng, cum, n):
+    return np.minimum(np.searchsorted(cum, rng.random(n) * cum[-1]), len(cum) - 1)
+
+
+def _days(start, offsets):
+    """ISO date strings of `start + offsets` days, formatted once per distinct day."""
+    days = (start + offsets.astype("timedelta64[D]")).astype(np.int64)
+    if not len(days):
+        return np.array([], dtype="<U10")
+    lo = days.min()
+    table = np.datetime_as_string(np.arange(lo, days.max() + 1).astype("datetime64[D]"), unit="D")
+    return table[days - lo]
+
+
+def _uuid4_strings(raw):
+    """Version 4 UUID strings from rows of 16 random bytes."""
+    raw = raw.copy()
+    raw[:, 6] = raw[:, 6] & 0x0F | 0x40
+    raw[:, 8] = raw[:, 8] & 0x3F | 0x80
+    nibbles = np.stack([raw >> 4, raw & 0x0F], axis=-1).reshape(len(raw), 32)
+    chars = np.full((len(raw), 36), ord("-"), dtype=np.uint8)
+    chars[:, UUID_HEX_COLUMNS] = HEX_DIGITS[nibbles]
+    return chars.view("S36").ravel().astype(str)
+
+
+def _to_date(years, months, days):
+    return ((years - 1970) * 12 + months - 1).astype("datetime64[M]").astype("datetime64[D]") + (days - 1)
+
+
+def draw_population(rng, died):
+    """Draw every attribute of `len(died)` pairs at once.
+
+    `died` marks the pairs whose infant dies. Returns three column tables of
+    NumPy arrays: `pairs` (one row per pair), `conditions` (one row per
+    condition, long format, in pair then condition order) and `weights` (one
+    row per weigh-in). Rates and multipliers match `generate_base_population`.
+    """
+    n = len(died)
+    county = _pick(rng, COUNTY_CUM_POP, n)
+    svi = np.array([c[3] for c in COUNTIES])[county]
+    race = _pick(rng, RACE_CUM, n)
+    gender = _pick(rng, GENDER_CUM, n)
+
+    mother_age = rng.triangular(16, 27, 44, n).astype(np.int64)
+    birth_year = rng.integers(2022, 2025, n)
+    birth_date = _to_date(birth_year, rng.integers(1, 13, n), rng.integers(1, 29, n))
+    mother_dob = _to_date(birth_year - mother_age, rng.integers(1, 13, n), rng.integers(1, 29, n))
+
+    is_preterm = rng.random(n) < 0.12
+    gest_age = np.where(is_preterm,
+                        np.clip(np.round(rng.normal(33, 3, n), 1), 24, 36),
+                        np.clip(np.round(rng.normal(39.2, 1.2, n), 1), 37, 42))
+    birth_weight = np.where(is_preterm,
+                            np.clip(np.rint(rng.normal(1800, 500, n)), 500, 3500),
+                            np.clip(np.rint(rng.normal(3200, 450, n)), 2500, 5000)).astype(np.int64)
+    birth_length = np.clip(np.round(rng.normal(49, 3, n), 1), 35, 56)
+    head_circ = np.clip(np.round(rng.normal(34, 1.5, n), 1), 28, 40)
+    apgar_1 = np.clip(np.rint(np.where(died, rng.normal(4, 2, n), rng.normal(7, 1.5, n))), 0, 10).astype(np.int64)
+    apgar_5 = np.clip(np.rint(np.where(died, rng.normal(5, 2, n), rng.normal(8, 1, n))), 0, 10).astype(np.int64)
+
+    death_range = DEATH_DAY_RANGES[_pick(rng, DEATH_DAY_CUM, n)]
+    days_to_death = rng.integers(death_range[:, 0], death_range[:, 1] + 1)
+
+    # Condition risks: base rate times SVI / death (maternal) or preterm / death (infant) multipliers.
+    mat_risk = np.minimum(
+        MATERNAL_RATES * np.where(svi > 0.8, 1.3, 1.0)[:, None] * np.where(died, 1.5, 1.0)[:, None], 0.9)
+    mat_pair, mat_cond = np.nonzero(rng.random(mat_risk.shape) < mat_risk)
+    mat_onset = rng.integers(30, 201, len(mat_pair))
+    routine_onset = rng.integers(180, 271, n)
+    inf_risk = np.minimum(
+        INFANT_RATES * np.where(is_preterm, 2.0, 1.0)[:, None] * np.where(died, 2.0, 1.0)[:, None], 0.95)
+    inf_pair, inf_cond = np.nonzero(rng.random(inf_risk.shape) < inf_risk)
+    inf_onset = rng.integers(0, 15, len(inf_pair))
+
+    prenatal_visits = np.maximum(0, np.rint(rng.normal(10.5, 3, n))).astype(np.int64)
+    mother_bmi = np.clip(np.round(rng.normal(26.3, 5, n), 1), 16, 55)
+    is_smoker = rng.random(n) < 0.121
+    insurance = _pick(rng, INSURANCE_CUM, n)
+    parity = np.maximum(0, np.rint(rng.normal(1.9, 1.2, n))).astype(np.int64)
+    gravidity = np.maximum(parity + 1, np.rint(rng.normal(2.8, 1.3, n))).astype(np.int64)
+    birth_hour = rng.integers(0, 24, n)
+    birth_minute = rng.integers(0, 60, n)
+    uuids = rng.integers(0, 256, (n, 2, 16), dtype=np.uint8)
+
+    # Weight trajectory: a weigh-in every 14-45 days until death or the first birthday,
+    # gaining ~25 g/day below 5 kg and ~15 g/day above, never below birth weight.
+    step = rng.integers(14, 46, (n, MAX_WEIGH_INS))
+    gap = rng.integers(14, 46, (n, MAX_WEIGH_INS))
+    noise = rng.normal(0, 5, (n, MAX_WEIGH_INS))
+    values = np.empty((n, MAX_WEIGH_INS))
+    current = birth_weight.astype(np.float64)
+    for k in range(MAX_WEIGH_INS):
+        values[:, k] = current
+        current = np.maximum(birth_weight, current + (np.where(current < 5000, 25, 15) + noise[:, k]) * gap[:, k])
+    offsets = np.cumsum(step, axis=1) - step
+    taken = offsets <= np.where(died, days_to_death, 365)[:, None]
+    weight_pair = np.nonzero(taken)[0]
+
+    conditions = {
+        "pair": np.concatenate([np.arange(n), mat_pair, inf_pair]),
+        "role": np.repeat(["mother", "mother", "infant"], [n, len(mat_pair), len(inf_pair)]),
+        "key": np.concatenate([
+            np.full(n, ROUTINE_PREGNANCY_CONDITION["key"]),
+            np.array(MATERNAL_KEYS)[mat_cond],
+            np.array(INFANT_KEYS)[inf_cond],
+        ]),
+        "onset_date": np.concatenate([
+            _days(birth_date, -routine_onset),
+            _days(birth_date[mat_pair], -mat_onset),
+            _days(birth_date[inf_pair], inf_onset),
+        ]),
+    }
+    # Stable sort keeps routine pregnancy first, then dictionary order within each pair.
+    order = np.argsort(conditions["pair"], kind="stable")
+    conditions = {k: v[order] for k, v in conditions.items()}
+
+    pairs = {
+        "county": county,
+        "race": race,
+        "gender": gender,
+        "birth_date": _days(birth_date, np.zeros(n, dtype=np.int64)),
+        "birth_hour": birth_hour,
+        "birth_minute": birth_minute,
+        "gestational_age_weeks": gest_age,
+        "birth_weight_g": birth_weight,
+        "apgar_1min": apgar_1,
+        "apgar_5min": apgar_5,
+        "birth_length_cm": birth_length,
+        "head_circumference_cm": head_circ,
+        "died": np.asarray(died, dtype=bool),
+        "death_date": np.where(died, _days(birth_date, days_to_death), ""),
+        "is_preterm": is_preterm,
+        "infant_uuid": _uuid4_strings(uuids[:, 0]),
+        "mother_uuid": _uuid4_strings(uuids[:, 1]),
+        "mother_age": mother_age,
+        "mother_dob": _days(mother_dob, np.zeros(n, dtype=np.int64)),
+        "bmi": mother_bmi,
+        "is_smoker": is_smoker,
+        "insurance": insurance,
+        "parity": parity,
+        "gravidity": gravidity,
+        "prenatal_visits": prenatal_visits,
+    }
+    weights = {
+        "pair": weight_pair,
+        "date": _days(birth_date[weight_pair], offsets[taken]),
+        "value": np.rint(values[taken]).astype(np.int64),
+    }
+    return {"pairs": pairs, "conditions": conditions, "weights": weights}
+
+
+def _group(table, n, make_row):
+    """`make_row(*columns)` for the rows of a long table, yielded as one list per pair."""
+    bounds = np.searchsorted(table["pair"], np.arange(n + 1)).tolist()
+    columns = [v.tolist() for k, v in table.items() if k != "pair"]
+    for i in range(n):
+        yield [make_row(*row) for row in zip(*(c[bounds[i]:bounds[i + 1]] for c in columns))]
+
+
+def iter_pairs(tables, first_pair_id, n_pairs):
+    """Pair dicts in the `generate_base_population` layout from `draw_population` tables,
+    built one at a time.
+
+    `first_pair_id` is the id of the first row and `n_pairs` the size of the whole
+    population, which fixes the mother id range.
+    """
+    cols = {k: v.tolist() for k, v in tables["pairs"].items()}
+    n = len(cols["county"])
+    condition_info = {**MATERNAL_CONDITIONS, **INFANT_CONDITIONS,
+                      ROUTINE_PREGNANCY_CONDITION["key"]: ROUTINE_PREGNANCY_CONDITION}
+
+    def condition(role, key, onset_date):
+        info = condition_info[key]
+        return role, {"key": key, "snomed": info["snomed"], "icd10": info["icd10"], "desc": info["desc"],
+                      "onset_date": onset_date}
+
+    conditions = _group(tables["conditions"], n, condition)
+    weights = _group(tables["weights"], n, lambda d, v: {"date": d, "value": v})
+    mother_base = mother_id_base(n_pairs)
+
+    for j, pair_conditions, trajectory in zip(range(n), conditions, weights):
+        i = first_pair_id + j
+        county_name, fips, _, svi = COUNTIES[cols["county"][j]]
+        race_label, race_concept, _ = RACE_DIST[cols["race"][j]]
+        gender_label, gender_concept, _ = GENDER_DIST[cols["gender"][j]]
+        birth_date = cols["birth_date"][j]
+        died = cols["died"][j]
+        pair = {
+            "pair_id": i,
+            "infant": {
+                "person_id": 200000 + i,
+                "mrn": f"MS-INF-{200000 + i}",
+                "uuid": cols["infant_uuid"][j],
+                "gender_label": gender_label,
+                "gender_concept_id": gender_concept,
+                "race_label": race_label,
+                "race_concept_id": race_concept,
+                "birth_date": birth_date,
+                "birth_datetime": f"{birth_date}T{cols['birth_hour'][j]:02d}:{cols['birth_minute'][j]:02d}:00",
+                "measurements": {
+                    "birth_weight_g": cols["birth_weight_g"][j],
+                    "gestational_age_weeks": cols["gestational_age_weeks"][j],
+                    "apgar_1min": cols["apgar_1min"][j],
+                    "apgar_5min": cols["apgar_5min"][j],
+                    "birth_length_cm": cols["birth_length_cm"][j],
+                    "head_circumference_cm": cols["head_circumference_cm"][j],
+                    "infant_weight_trajectory": trajectory,
+                },
+                "conditions": [c for role, c in pair_conditions if role == "infant"],
+                "died": died,
+                "death_date": cols["death_date"][j] if died else None,
+                "is_preterm": cols["is_preterm"][j],
+            },
+            "mother": {
+                "person_id": mother_base + i,
+                "mrn": f"MS-MAT-{mother_base + i}",
+                "uuid": cols["mother_uuid"][j],
+                "age_at_birth": cols["mother_age"][j],
+                "dob": cols["mother_dob"][j],
+                "race_label": race_label,
+                "race_concept_id": race_concept,
+                "conditions": [c for role, c in pair_conditions if role == "mother"],
+                "bmi": cols["bmi"][j],
+                "is_smoker": cols["is_smoker"][j],
+                "insurance": INSURANCE_TYPES[cols["insurance"][j]],
+                "parity": cols["parity"][j],
+                "gravidity": cols["gravidity"][j],
+                "prenatal_visits": cols["prenatal_visits"][j],
+            },
+            "county": {"name": county_name, "fips": fips, "svi": svi},
+        }
+        yield pair
+
+
+def shard_rng(seed, shard):
+    """Generator for one shard, keyed by (seed, shard index) like `SeedSequence.spawn`,
+    so a shard's draws do not depend on which process generates it or in what order."""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(1, shard)))
+
+
+def death_indices(n_pairs, seed):
+    """Sorted indices of the pairs whose infant dies, drawn from a stream of their own."""
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(0,)))
+    return np.sort(rng.choice(n_pairs, n_deaths(n_pairs), replace=False))
+
+
+def shard_ranges(n_pairs, shard_size=SHARD_SIZE):
+    return [(start, min(start + shard_size, n_pairs)) for start in range(0, n_pairs, shard_size)]
+
+
+def generate_shard(n_pairs, seed, shard, start, stop, deaths):
+    return list(iter_shard(n_pairs, seed, shard, start, stop, deaths))
+
+
+def iter_shard(n_pairs, seed, shard, start, stop, deaths):
+    died = np.zeros(stop - start, dtype=bool)
+    died[deaths[(deaths >= start) & (deaths < stop)] - start] = True
+    return iter_pairs(draw_population(shard_rng(seed, shard), died), start, n_pairs)
+
+
+def generate_base_population_vectorized(n_pairs=N_PAIRS, seed=42, shard_size=SHARD_SIZE):
+    """Same population model as `generate_base_population`, drawn column-wise with NumPy.
+
+    Not draw-for-draw identical to the `random`-based generator, but with the
+    same rates, multipliers and clamps. Pairs are drawn shard by shard exactly
+    as `generate_sharded` does, so both produce the same population.
+    """
+    return list(iter_base_population(n_pairs, seed, shard_size))
+
+
+def iter_base_population(n_pairs=N_PAIRS, seed=42, shard_size=SHARD_SIZE):
+    """`generate_base_population_vectorized` as a generator: only one shard's columns
+    are held at a time, so memory is bounded by `shard_size`, not `n_pairs`."""
+    deaths = death_indices(n_pairs, seed)
+    for shard, (start, stop) in enumerate(shard_ranges(n_pairs, shard_size)):
+        yield from iter_shard(n_pairs, seed, shard, start, stop, deaths)
+
+
+def _write_shard_job(job):
+    directory, fmt, n_pairs, seed, shard, start, stop, deaths = job
+    pairs = generate_shard(n_pairs, seed, shard, start, stop, deaths)
+    entry = write_shard(directory, shard, pairs, fmt)
+    entry["deaths"] = sum(p["infant"]["died"] for p in pairs)
+    entry["preterm"] = sum(p["infant"]["is_preterm"] for p in pairs)
+    return entry
+
+
+def generate_sharded(directory, n_pairs=N_PAIRS, seed=42, shard_size=SHARD_SIZE, workers=None, fmt=DEFAULT_FORMAT):
+    """Generate the population as `shard_size`-pair shards across `workers` processes.
+
+    Each shard is written to its own file by the process that drew it, and a
+    manifest lists the shards in order. Shard contents depend only on `seed`,
+    `n_pairs` and `shard_size`, so any worker count gives identical files.
+    """
+    deaths = death_indices(n_pairs, seed)
+    jobs = [
+        (directory, fmt, n_pairs, seed, shard, start, stop, deaths[(deaths >= start) & (deaths < stop)])
+        for shard, (start, stop) in enumerate(shard_ranges(n_pairs, shard_size))
+    ]
+    with ProcessPoolExecutor(workers) as pool:
+        shards = list(pool.map(_write_shard_job, jobs))
+    manifest = {
+        "format": fmt,
+        "n_pairs": n_pairs,
+        "seed": seed,
+        "shard_size": shard_size,
+        "generated_at": datetime.now().isoformat(),
+        "shards": shards,
+    }
+    write_manifest(directory, manifest)
+    return manifest
+
+
+def write_sharded(directory, pairs, fmt=DEFAULT_FORMAT, shard_size=SHARD_SIZE, seed=None):
+    """Write already generated `pairs` in `fmt` as shards with a manifest, like
+    `generate_sharded` does for shards drawn in worker processes."""
+    shards = [
+        write_shard(directory, shard, pairs[start:stop], fmt)
+        for shard, (start, stop) in enumerate(shard_ranges(len(pairs), shard_size))
+    ]
+    manifest = {
+        "format": fmt,
+        "n_pairs": len(pairs),
+        "seed": seed,
+        "shard_size": shard_size,
+        "generated_at": datetime.now().isoformat(),
+        "shards": shards,
+    }
+    write_manifest(directory, manifest)
+    return manifest
+
+
 def main():
-    print(f"Generating {N_PAIRS} mother-infant pairs...")
-    pairs = generate_base_population()
+    parser = argparse.ArgumentParser(description="Generate the synthetic mother-infant base population")
+    parser.add_argument("--pairs", type=int, default=N_PAIRS, help="Number of mother-infant pairs")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="Draw with NumPy (fast, for large populations; different draws than the default)")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for --vectorized and --workers")
+    parser.add_argument("--workers", type=int, help="Generate vectorized shards in this many processes")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="Pairs per shard")
+    parser.add_argument("--format", choices=FORMATS, default=DEFAULT_FORMAT,
+                        help="parquet or ndjson shards with a manifest in output/base_population/, or json: "
+                             "a single base_population.json (json shards with --workers)")
+    args = parser.parse_args()
+
+    print(f"Generating {args.pairs} mother-infant pairs...")
+    if args.workers:
+        directory = shard_dir(os.path.join(OUTPUT_DIR, "base_population.json"))
+        manifest = generate_sharded(directory, args.pairs, args.seed, args.shard_size, args.workers, args.format)
+        deaths = sum(s["deaths"] for s in manifest["shards"])
+        preterm = sum(s["preterm"] for s in manifest["shards"])
+        print(f"\n=== BASE POPULATION SHARDS ===")
+        print(f"  Total pairs:    {args.pairs}")
+        print(f"  Deaths:         {deaths} ({deaths/args.pairs*1000:.1f}/1000)")
+        print(f"  Preterm:        {preterm} ({preterm/args.pairs*100:.1f}%)")
+        print(f"  Shards:         {len(manifest['shards'])} x {args.shard_size} pairs, {args.workers} workers")
+        print(f"\n  Manifest saved: {os.path.join(directory, 'manifest.json')}")
+        return manifest
+
+    if args.vectorized:
+        pairs = generate_base_population_vectorized(args.pairs, args.seed, args.shard_size)
+    else:
+        pairs = generate_base_population(args.pairs)
 
     deaths = sum(1 for p in pairs if p["infant"]["died"])
     preterm = sum(1 for p in pairs if p["infant"]["is_preterm"])
@@ -318,9 +709,19 @@ def main():
         print(f"    {k}: {v} ({v/len(pairs)*100:.1f}%)")
 
     base_path = os.path.join(OUTPUT_DIR, "base_population.json")
+    if args.format != "json":
+        directory = shard_dir(base_path)
+        manifest = write_sharded(directory, pairs, args.format, args.shard_size,
+                                 args.seed if args.vectorized else None)
+        size = sum(s["bytes"] for s in manifest["shards"])
+        print(f"\n  Base population saved: {directory}/ ({args.format}, {size / 1e6:.1f} MB)")
+        return pairs
+
     os.makedirs(os.path.dirname(base_path), exist_ok=True)
     with open(base_path, "w") as f:
         json.dump(pairs, f, indent=2, default=str)
+    # Readers prefer a sharded run with a manifest; this file supersedes it.
+    discard_sharded(base_path)
     print(f"\n  Base population saved: {base_path}")
 
     return pairs
@@ -1,8 +1,9 @@
-import json
 import os
 import csv
 import random
 
+from population_store import iter_population
+
 random.seed(42)
 
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "output")
@@ -62,21 +63,20 @@ RACE_TO_CONCEPT = {
 GENDER_TO_CONCEPT = {"Male": 8507, "Female": 8532}
 
 
-def generate_omop(pairs):
-    os.makedirs(OMOP_DIR, exist_ok=True)
+OMOP_TABLES = ["person", "death", "condition_occurrence", "measurement", "visit_occurrence", "fact_relationship"]
 
-    persons = []
-    deaths = []
-    conditions = []
-    measurements = []
-    visits = []
-    fact_rels = []
 
-    condition_id = 1
-    measurement_id = 1
-    visit_id = 1
+class OmopWriter:
+    """OMOP CDM tables written incrementally, one `add(pair)` at a time."""
 
-    for pair in pairs:
+    def __init__(self, directory=OMOP_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.tables = [_DictCsvTable(os.path.join(directory, f"{table}.csv")) for table in OMOP_TABLES]
+        self.next_ids = (1, 1, 1)
+
+    def add(self, pair):
+        persons, deaths, conditions, measurements, visits, fact_rels = [], [], [], [], [], []
+        condition_id, measurement_id, visit_id = self.next_ids
         infant = pair["infant"]
         mother = pair["mother"]
 
@@ -247,37 +247,49 @@ def generate_omop(pairs):
             "relationship_concept_id": 4326300,
         })
 
-    _write_csv_from_dicts(os.path.join(OMOP_DIR, "person.csv"), persons)
-    _write_csv_from_dicts(os.path.join(OMOP_DIR, "death.csv"), deaths)
-    _write_csv_from_dicts(os.path.join(OMOP_DIR, "condition_occurrence.csv"), conditions)
-    _write_csv_from_dicts(os.path.join(OMOP_DIR, "measurement.csv"), measurements)
-    _write_csv_from_dicts(os.path.join(OMOP_DIR, "visit_occurrence.csv"), visits)
-    _write_csv_from_dicts(os.path.join(OMOP_DIR, "fact_relationship.csv"), fact_rels)
+        self.next_ids = (condition_id, measurement_id, visit_id)
+        for table, rows in zip(self.tables, (persons, deaths, conditions, measurements, visits, fact_rels)):
+            table.write(rows)
+
+    def close(self):
+        return {name: table.close() for name, table in zip(OMOP_TABLES, self.tables)}
+
 
-    return {
-        "person": len(persons),
-        "death": len(deaths),
-        "condition_occurrence": len(conditions),
-        "measurement": len(measurements),
-        "visit_occurrence": len(visits),
-        "fact_relationship": len(fact_rels),
-    }
+def generate_omop(pairs):
+    writer = OmopWriter()
+    for pair in pairs:
+        writer.add(pair)
+    return writer.close()
 
 
-def _write_csv_from_dicts(path, data):
-    if not data:
-        return
-    with open(path, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=data[0].keys())
-        writer.writeheader()
-        writer.writerows(data)
+class _DictCsvTable:
+    """A CSV file of dict rows, written incrementally. Columns come from the first
+    row, and no file is created until a row arrives."""
 
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._writer = None
+        self.rows = 0
 
-def main():
-    with open(BASE_POP_PATH) as f:
-        pairs = json.load(f)
+    def write(self, rows):
+        if not rows:
+            return
+        if self._writer is None:
+            self._file = open(self.path, "w", newline="")
+            self._writer = csv.DictWriter(self._file, fieldnames=rows[0].keys())
+            self._writer.writeheader()
+        self._writer.writerows(rows)
+        self.rows += len(rows)
 
-    counts = generate_omop(pairs)
+    def close(self):
+        if self._file:
+            self._file.close()
+        return self.rows
+
+
+def main():
+    counts = generate_omop(iter_population(BASE_POP_PATH))
 
     print(f"\n=== OMOP GROUND TRUTH ===")
     for table, count in counts.items():
@@ -0,0 +1,84 @@
+import argparse
+import random
+import time
+
+from base_population import N_PAIRS, SHARD_SIZE, iter_base_population
+from generate_omop_ground_truth import OMOP_DIR, OmopWriter
+from serialize_csv import CSV_DIR, AmbiguousCsvWriter, CernerCsvWriter, EpicCsvWriter
+from serialize_fhir import QUALITY_TIERS, FhirWriter
+from serialize_fhir import print_summary as print_fhir_summary
+from serialize_hl7v2 import HL7V2_TIERS, Hl7Writer
+from serialize_hl7v2 import print_summary as print_hl7_summary
+
+
+def tier_cycle(tiers, rng):
+    """Endless tier labels: each block of `sum(tiers.values())` pairs gets exactly the
+    configured count of every tier, shuffled within the block."""
+    block = [tier for tier, count in tiers.items() for _ in range(count)]
+    while True:
+        rng.shuffle(block)
+        yield from block
+
+
+def run(n_pairs=N_PAIRS, seed=42, shard_size=SHARD_SIZE, compression=None):
+    """Generate pairs with the vectorized generator and hand each one to every serializer
+    as it is produced, so no base_population.json is written and memory is bounded by
+    `shard_size` rather than `n_pairs`."""
+    rng = random.Random(seed)
+    fhir_tiers = tier_cycle(QUALITY_TIERS, rng)
+    hl7_tiers = tier_cycle(HL7V2_TIERS, rng)
+
+    fhir = FhirWriter(compression=compression)
+    hl7 = Hl7Writer()
+    csvs = [EpicCsvWriter(), CernerCsvWriter(), AmbiguousCsvWriter()]
+    omop = OmopWriter()
+
+    for pair in iter_base_population(n_pairs, seed, shard_size):
+        fhir.add(pair, next(fhir_tiers))
+        hl7.add(pair, next(hl7_tiers))
+        for writer in csvs:
+            writer.add(pair)
+        omop.add(pair)
+
+    fhir.close()
+    hl7.close()
+    csv_counts = [writer.close() for writer in csvs]
+    omop_counts = omop.close()
+    return fhir, hl7, csv_counts, omop_counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate the base population and serialize it to every output format in one pass")
+    parser.add_argument("--pairs", type=int, default=N_PAIRS, help="Number of mother-infant pairs")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the population and tier assignment")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="Pairs generated per batch")
+    parser.add_argument("--compress", choices=["gzip", "zstd"], help="Compress the FHIR NDJSON files as they are written")
+    args = parser.parse_args()
+
+    print(f"Generating and serializing {args.pairs} mother-infant pairs...")
+    started = time.perf_counter()
+    fhir, hl7, (epic, cerner, ambiguous), omop_counts = run(args.pairs, args.seed, args.shard_size, args.compress)
+    elapsed = time.perf_counter() - started
+
+    print_fhir_summary(fhir)
+    print_hl7_summary(hl7)
+
+    ep, ee, ed, ef = epic
+    cp, ce, cd, cr = cerner
+    print(f"\n=== EHR CSV OUTPUT ===")
+    print(f"  Epic-style:       {ep} patients, {ee} encounters, {ed} diagnoses, {ef} flowsheets")
+    print(f"  Cerner-style:     {cp} persons, {ce} encounters, {cd} diagnoses, {cr} results")
+    print(f"  Ambiguous-header: {ambiguous} rows")
+    print(f"  Output:           {CSV_DIR}/")
+
+    print(f"\n=== OMOP GROUND TRUTH ===")
+    for table, count in omop_counts.items():
+        print(f"  {table:30s} {count:>6} rows")
+    print(f"  Output: {OMOP_DIR}/")
+
+    print(f"\n  {args.pairs} pairs in {elapsed:.1f}s ({args.pairs / elapsed:.0f} pairs/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import gc
+import hashlib
+import io
+import json
+import os
+from collections import deque
+from itertools import repeat
+from operator import setitem
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+MANIFEST_NAME = "manifest.json"
+
+# Shard formats. "parquet" stores each shard as column tables: one row per pair, plus
+# one long table per list field (conditions, weight trajectory) keyed by the pair's
+# row. "ndjson" is one compact pair per line; "json" is an indented array per shard.
+FORMATS = ("parquet", "ndjson", "json")
+DEFAULT_FORMAT = "parquet" if pa else "ndjson"
+PAIRS_TABLE = "pairs"
+
+
+def shard_dir(base_path):
+    """Directory holding the sharded form of the population at `base_path`
+    (`.../base_population.json` -> `.../base_population/`)."""
+    return os.path.splitext(base_path)[0]
+
+
+def _columns(rows):
+    """Column lists for dict rows, in first-row key order. A column mixing value types
+    (e.g. ints and floats) is JSON-encoded so it reads back exactly as written."""
+    names = list(dict.fromkeys(key for row in rows[:1] for key in row))
+    columns, encoded = {}, []
+    for name in names:
+        values = [row.get(name) for row in rows]
+        if len({type(v) for v in values if v is not None}) > 1:
+            values = [json.dumps(v) for v in values]
+            encoded.append(name)
+        columns[name] = values
+    return columns, encoded
+
+
+def _flatten(obj, prefix, row, lists, index, layout):
+    for key, value in obj.items():
+        path = prefix + key
+        if isinstance(value, dict):
+            _flatten(value, path + ".", row, lists, index, layout)
+            continue
+        if layout is not None:
+            layout.append([path, isinstance(value, list)])
+        if isinstance(value, list):
+            lists.setdefault(path, []).extend({"pair": index, **item} for item in value)
+        else:
+            row[path] = value
+
+
+def _parquet_bytes(rows, metadata):
+    columns, encoded = _columns(rows)
+    table = pa.table(columns) if columns else pa.table({"pair": pa.array([], pa.int64())})
+    meta = json.dumps({**metadata, "json_columns": encoded})
+    table = table.replace_schema_metadata({"population": meta})
+    buf = io.BytesIO()
+    pq.write_table(table, buf, compression="zstd")
+    return buf.getvalue()
+
+
+def _encode_parquet(pairs):
+    """`{table name: parquet bytes}` for one shard. Nested dicts become dotted column
+    names (`infant.measurements.birth_weight_g`); the key layout of the first pair is
+    kept in the pairs table's metadata so pairs rebuild with their original key order."""
+    if pa is None:
+        raise RuntimeError("The parquet format needs pyarrow (pip install pyarrow)")
+    rows, lists, layout = [], {}, []
+    for i, pair in enumerate(pairs):
+        row = {}
+        _flatten(pair, "", row, lists, i, layout if i == 0 else None)
+        rows.append(row)
+    tables = {PAIRS_TABLE: _parquet_bytes(rows, {"layout": layout})}
+    for path, is_list in layout:
+        if is_list:
+            tables[path] = _parquet_bytes(lists.get(path, []), {})
+    return tables
+
+
+def _encode_shard(pairs, fmt):
+    if fmt == "parquet":
+        return {f"{name}.parquet": data for name, data in _encode_parquet(pairs).items()}
+    if fmt == "ndjson":
+        lines = "".join(json.dumps(pair, default=str, separators=(",", ":")) + "\n" for pair in pairs)
+        return {"ndjson": lines.encode()}
+    if fmt == "json":
+        return {"json": json.dumps(pairs, indent=2, default=str).encode()}
+    raise ValueError(f"Unknown population format '{fmt}', expected one of {', '.join(FORMATS)}")
+
+
+def write_shard(directory, shard, pairs, fmt="json"):
+    """Write one shard in `fmt`; returns its manifest entry."""
+    os.makedirs(directory, exist_ok=True)
+    files = {}
+    for suffix, data in _encode_shard(pairs, fmt).items():
+        name = f"shard-{shard:05d}.{suffix}"
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(data)
+        files[name] = {"bytes": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+    return {
+        "shard": shard,
+        "files": files,
+        "first_pair_id": pairs[0]["pair_id"] if pairs else None,
+        "n_pairs": len(pairs),
+        "bytes": sum(f["bytes"] for f in files.values()),
+    }
+
+
+def write_manifest(directory, manifest):
+    """Write the manifest last, so a directory without one is an incomplete run."""
+    tmp = os.path.join(directory, MANIFEST_NAME + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(directory, MANIFEST_NAME))
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def _read_parquet(path):
+    table = pq.read_table(path, memory_map=True)
+    meta = json.loads(table.schema.metadata[b"population"])
+    columns = table.to_pydict()
+    for name in meta["json_columns"]:
+        columns[name] = [json.loads(v) for v in columns[name]]
+    return columns, table.num_rows, meta
+
+
+def _nest_level(node, n):
+    objs = list(map(dict.copy, repeat(dict.fromkeys(node), n)))
+    for key, value in node.items():
+        column = _nest_level(value, n) if isinstance(value, dict) else value
+        deque(map(setitem, objs, repeat(key), column), maxlen=0)
+    return objs
+
+
+def _nest(paths, columns, n):
+    """`n` nested dicts from equal-length `columns`, with the dotted `paths` as keys.
+
+    Each level starts as copies of a template that already holds its keys, so key
+    order is kept, and is filled a column at a time with `map(setitem, ...)`, so
+    the per-row work runs in C rather than Python code; this is about as fast as
+    a dict literal per row.
+    """
+    tree = {}
+    for path, column in zip(paths, columns):
+        *parents, key = path.split(".")
+        node = tree
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[key] = column
+    return _nest_level(tree, n)
+
+
+def _decode_parquet(directory, files):
+    """Pairs of one parquet shard, rebuilt from its column tables."""
+    by_table = {name.split(".", 1)[1][:-len(".parquet")]: name for name in files}
+    columns, n, meta = _read_parquet(os.path.join(directory, by_table[PAIRS_TABLE]))
+    values = []
+    for path, is_list in meta["layout"]:
+        if not is_list:
+            values.append(columns[path])
+            continue
+        lists = [[] for _ in range(n)]
+        list_columns, rows, _ = _read_parquet(os.path.join(directory, by_table[path]))
+        index = list_columns.pop("pair", [])
+        for i, item in zip(index, _nest(list(list_columns), list_columns.values(), rows)):
+            lists[i].append(item)
+        values.append(lists)
+    return _nest([path for path, _ in meta["layout"]], values, n)
+
+
+def _without_gc(fn, *args):
+    """`fn(*args)` with the cyclic collector paused. Reading a shard allocates
+    millions of acyclic dicts and lists, which otherwise trigger collections
+    that find nothing and take about half the decode time."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return fn(*args)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _read_shard(directory, fmt, files):
+    if fmt == "parquet":
+        return _decode_parquet(directory, files)
+    with open(os.path.join(directory, next(iter(files)))) as f:
+        if fmt == "ndjson":
+            return [json.loads(line) for line in f]
+        return json.load(f)
+
+
+def iter_shards(directory):
+    """Pairs of each shard in manifest order, one shard in memory at a time."""
+    manifest = read_manifest(directory)
+    for entry in manifest["shards"]:
+        yield _without_gc(_read_shard, directory, manifest["format"], entry["files"])
+
+
+def has_sharded(base_path):
+    """Whether a complete sharded run sits next to `base_path`."""
+    return os.path.exists(os.path.join(shard_dir(base_path), MANIFEST_NAME))
+
+
+def discard_sharded(base_path):
+    """Drop the manifest of the sharded run next to `base_path`, after a new
+    `base_path` was written, so readers use that file from then on."""
+    try:
+        os.remove(os.path.join(shard_dir(base_path), MANIFEST_NAME))
+    except FileNotFoundError:
+        pass
+
+
+def iter_population(base_path):
+    """Pairs one at a time, from the sharded run next to `base_path` when it has a
+    manifest, else from `base_path`. Sharded runs are read a shard at a time."""
+    if has_sharded(base_path):
+        for shard in iter_shards(shard_dir(base_path)):
+            yield from shard
+        return
+    with open(base_path) as f:
+        yield from json.load(f)
+
+
+def load_base_population(base_path):
+    """All pairs, from the sharded run next to `base_path` when it has a manifest
+    (stitched together in shard order), else from `base_path`."""
+    return list(iter_population(base_path))
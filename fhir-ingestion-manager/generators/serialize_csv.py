@@ -1,9 +1,10 @@
-import json
 import os
 import csv
 import random
 from datetime import datetime, timedelta
 
+from population_store import iter_population
+
 random.seed(42)
 
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "output")
@@ -68,12 +69,36 @@ def cerner_datetime(iso_date):
     return iso_date.replace("T", " ") + ".000" if "T" not in str(iso_date) else str(iso_date).replace("T", " ")
 
 
-def generate_epic_csvs(pairs):
-    os.makedirs(os.path.join(CSV_DIR, "epic"), exist_ok=True)
+class _CsvTable:
+    """A CSV file written incrementally, header first."""
 
-    patients, encounters, diagnoses, flowsheets = [], [], [], []
+    def __init__(self, path, headers):
+        self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(headers)
+        self.rows = 0
 
-    for pair in pairs:
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self.rows += len(rows)
+
+    def close(self):
+        self._file.close()
+        return self.rows
+
+
+class EpicCsvWriter:
+    def __init__(self, directory=os.path.join(CSV_DIR, "epic")):
+        os.makedirs(directory, exist_ok=True)
+        self.tables = [
+            _CsvTable(os.path.join(directory, "patients.csv"), EPIC_PATIENT_HEADERS),
+            _CsvTable(os.path.join(directory, "encounters.csv"), EPIC_ENCOUNTER_HEADERS),
+            _CsvTable(os.path.join(directory, "diagnoses.csv"), EPIC_DIAGNOSIS_HEADERS),
+            _CsvTable(os.path.join(directory, "flowsheets.csv"), EPIC_FLOWSHEET_HEADERS),
+        ]
+
+    def add(self, pair):
+        patients, encounters, diagnoses, flowsheets = [], [], [], []
         infant = pair["infant"]
         mother = pair["mother"]
 
@@ -132,20 +157,32 @@ def generate_epic_csvs(pairs):
                 infant["birth_datetime"], f"USR{random.randint(1000,9999)}",
             ])
 
-    _write_csv(os.path.join(CSV_DIR, "epic", "patients.csv"), EPIC_PATIENT_HEADERS, patients)
-    _write_csv(os.path.join(CSV_DIR, "epic", "encounters.csv"), EPIC_ENCOUNTER_HEADERS, encounters)
-    _write_csv(os.path.join(CSV_DIR, "epic", "diagnoses.csv"), EPIC_DIAGNOSIS_HEADERS, diagnoses)
-    _write_csv(os.path.join(CSV_DIR, "epic", "flowsheets.csv"), EPIC_FLOWSHEET_HEADERS, flowsheets)
-
-    return len(patients), len(encounters), len(diagnoses), len(flowsheets)
-
+        for table, rows in zip(self.tables, (patients, encounters, diagnoses, flowsheets)):
+            table.write(rows)
 
-def generate_cerner_csvs(pairs):
-    os.makedirs(os.path.join(CSV_DIR, "cerner"), exist_ok=True)
+    def close(self):
+        return tuple(table.close() for table in self.tables)
 
-    persons, encounters, diagnoses, results = [], [], [], []
 
+def generate_epic_csvs(pairs):
+    writer = EpicCsvWriter()
     for pair in pairs:
+        writer.add(pair)
+    return writer.close()
+
+
+class CernerCsvWriter:
+    def __init__(self, directory=os.path.join(CSV_DIR, "cerner")):
+        os.makedirs(directory, exist_ok=True)
+        self.tables = [
+            _CsvTable(os.path.join(directory, "persons.csv"), CERNER_PATIENT_HEADERS),
+            _CsvTable(os.path.join(directory, "encounters.csv"), CERNER_ENCOUNTER_HEADERS),
+            _CsvTable(os.path.join(directory, "diagnoses.csv"), CERNER_DIAGNOSIS_HEADERS),
+            _CsvTable(os.path.join(directory, "results.csv"), CERNER_RESULT_HEADERS),
+        ]
+
+    def add(self, pair):
+        persons, encounters, diagnoses, results = [], [], [], []
         infant = pair["infant"]
         mother = pair["mother"]
 
@@ -193,19 +230,27 @@ def generate_cerner_csvs(pairs):
                 cerner_datetime(infant["birth_datetime"]), "AUTH",
             ])
 
-    _write_csv(os.path.join(CSV_DIR, "cerner", "persons.csv"), CERNER_PATIENT_HEADERS, persons)
-    _write_csv(os.path.join(CSV_DIR, "cerner", "encounters.csv"), CERNER_ENCOUNTER_HEADERS, encounters)
-    _write_csv(os.path.join(CSV_DIR, "cerner", "diagnoses.csv"), CERNER_DIAGNOSIS_HEADERS, diagnoses)
-    _write_csv(os.path.join(CSV_DIR, "cerner", "results.csv"), CERNER_RESULT_HEADERS, results)
-
-    return len(persons), len(encounters), len(diagnoses), len(results)
+        for table, rows in zip(self.tables, (persons, encounters, diagnoses, results)):
+            table.write(rows)
 
+    def close(self):
+        return tuple(table.close() for table in self.tables)
 
-def generate_ambiguous_csvs(pairs):
-    os.makedirs(os.path.join(CSV_DIR, "ambiguous"), exist_ok=True)
 
-    rows = []
+def generate_cerner_csvs(pairs):
+    writer = CernerCsvWriter()
     for pair in pairs:
+        writer.add(pair)
+    return writer.close()
+
+
+class AmbiguousCsvWriter:
+    def __init__(self, directory=os.path.join(CSV_DIR, "ambiguous")):
+        os.makedirs(directory, exist_ok=True)
+        self.table = _CsvTable(os.path.join(directory, "clinical_export.csv"), AMBIGUOUS_HEADERS)
+
+    def add(self, pair):
+        rows = []
         infant = pair["infant"]
         mother = pair["mother"]
 
@@ -241,24 +286,29 @@ def generate_ambiguous_csvs(pairs):
 
         rows.append(base_row + enc_row + obs_row + death_row)
 
-    _write_csv(os.path.join(CSV_DIR, "ambiguous", "clinical_export.csv"), AMBIGUOUS_HEADERS, rows)
-    return len(rows)
+        self.table.write(rows)
+
+    def close(self):
+        return self.table.close()
 
 
-def _write_csv(path, headers, rows):
-    with open(path, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(headers)
-        writer.writerows(rows)
+def generate_ambiguous_csvs(pairs):
+    writer = AmbiguousCsvWriter()
+    for pair in pairs:
+        writer.add(pair)
+    return writer.close()
 
 
 def main():
-    with open(BASE_POP_PATH) as f:
-        pairs = json.load(f)
-
     os.makedirs(CSV_DIR, exist_ok=True)
 
-    ep, ee, ed, ef = generate_epic_csvs(pairs)
+    # One streamed pass feeds every style, so the population is read once.
+    writers = [EpicCsvWriter(), CernerCsvWriter(), AmbiguousCsvWriter()]
+    for pair in iter_population(BASE_POP_PATH):
+        for writer in writers:
+            writer.add(pair)
+    (ep, ee, ed, ef), (cp, ce, cd, cr), ar = [writer.close() for writer in writers]
+
     print(f"\n=== EHR CSV OUTPUT ===")
     print(f"  Epic-style:")
     print(f"    patients.csv:     {ep} rows")
@@ -266,14 +316,12 @@ def main():
     print(f"    diagnoses.csv:    {ed} rows")
     print(f"    flowsheets.csv:   {ef} rows")
 
-    cp, ce, cd, cr = generate_cerner_csvs(pairs)
     print(f"  Cerner-style:")
     print(f"    persons.csv:      {cp} rows")
     print(f"    encounters.csv:   {ce} rows")
     print(f"    diagnoses.csv:    {cd} rows")
     print(f"    results.csv:      {cr} rows")
 
-    ar = generate_ambiguous_csvs(pairs)
     print(f"  Ambiguous-header:")
     print(f"    clinical_export.csv: {ar} rows")
 
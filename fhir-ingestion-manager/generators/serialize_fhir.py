@@ -1,9 +1,18 @@
+import argparse
+import gzip
 import json
 import os
 import random
 import uuid
 from datetime import datetime
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from population_store import load_base_population
+
 random.seed(42)
 
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "output")
@@ -246,11 +255,81 @@ def serialize_pair_to_bundle(pair, quality_tier):
     return bundle
 
 
+COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def open_output(path, compression=None):
+    """Binary stream writing `path`, compressed on the fly with "gzip" or "zstd"
+    (needs the zstandard package); the file name gets the matching suffix."""
+    path += COMPRESSION_SUFFIXES[compression]
+    if compression == "gzip":
+        # mtime=0 keeps the header, and so the file, reproducible.
+        return gzip.GzipFile(path, "wb", compresslevel=6, mtime=0)
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd compression needs the zstandard package (pip install zstandard)")
+        return zstandard.ZstdCompressor().stream_writer(open(path, "wb"))
+    return open(path, "wb")
+
+
+class FhirWriter:
+    """Bundles serialized as pairs arrive: each is JSON-encoded once and the same bytes
+    are written to the combined NDJSON file and its quality tier's file, optionally
+    compressed. No bundle is kept after it is written. The first bundle is also
+    written as the pretty-printed sample."""
+
+    def __init__(self, directory=FHIR_DIR, compression=None):
+        os.makedirs(directory, exist_ok=True)
+        suffix = COMPRESSION_SUFFIXES[compression]
+        self.ndjson_path = os.path.join(directory, "fhir_bundles.ndjson") + suffix
+        self.tier_glob = os.path.join(directory, "fhir_*.ndjson") + suffix
+        self.sample_path = os.path.join(directory, "sample_bundle.json")
+        self._all = open_output(os.path.join(directory, "fhir_bundles.ndjson"), compression)
+        self._tiers = {
+            tier: open_output(os.path.join(directory, f"fhir_{tier}.ndjson"), compression) for tier in QUALITY_TIERS
+        }
+        self.bundles = 0
+        self.tier_counts = {t: 0 for t in QUALITY_TIERS}
+        self.resource_counts = {t: 0 for t in ["Patient", "Condition", "Observation", "Encounter", "RelatedPerson"]}
+
+    def add(self, pair, tier):
+        bundle = serialize_pair_to_bundle(pair, tier)
+        line = (json.dumps(bundle, default=str) + "\n").encode()
+        self._all.write(line)
+        self._tiers[tier].write(line)
+        if not self.bundles:
+            with open(self.sample_path, "w") as f:
+                json.dump(bundle, f, indent=2, default=str)
+        self.bundles += 1
+        self.tier_counts[tier] += 1
+        for entry in bundle["entry"]:
+            rtype = entry["resource"]["resourceType"]
+            self.resource_counts[rtype] = self.resource_counts.get(rtype, 0) + 1
+
+    def close(self):
+        self._all.close()
+        for f in self._tiers.values():
+            f.close()
+
+
+def print_summary(writer):
+    print(f"\n=== FHIR R4 OUTPUT ===")
+    print(f"  Total bundles:  {writer.bundles}")
+    print(f"  Quality tiers:  {dict(writer.tier_counts)}")
+    print(f"  Resources:      {dict(writer.resource_counts)}")
+    print(f"  NDJSON:         {writer.ndjson_path}")
+    print(f"  Sample:         {writer.sample_path}")
+    print(f"  Tier files:     {writer.tier_glob}")
+
+
 def main():
-    with open(BASE_POP_PATH) as f:
-        pairs = json.load(f)
+    parser = argparse.ArgumentParser(description="Serialize the base population to FHIR R4 bundles")
+    parser.add_argument("--compress", choices=["gzip", "zstd"], help="Compress the NDJSON files as they are written")
+    args = parser.parse_args()
 
-    os.makedirs(FHIR_DIR, exist_ok=True)
+    # Pairs are written in shuffled tier order, which needs the whole population in
+    # memory. `pipeline.py` streams instead, drawing each pair's tier as it goes.
+    pairs = load_base_population(BASE_POP_PATH)
 
     tier_assignments = []
     idx = 0
@@ -261,41 +340,11 @@ def main():
                 idx += 1
     random.shuffle(tier_assignments)
 
-    bundles = []
-    tier_counts = {t: 0 for t in QUALITY_TIERS}
-    resource_counts = {t: 0 for t in ["Patient", "Condition", "Observation", "Encounter", "RelatedPerson"]}
-
+    writer = FhirWriter(compression=args.compress)
     for pair_idx, tier in tier_assignments:
-        bundle = serialize_pair_to_bundle(pairs[pair_idx], tier)
-        bundles.append(bundle)
-        tier_counts[tier] += 1
-        for entry in bundle["entry"]:
-            rtype = entry["resource"]["resourceType"]
-            resource_counts[rtype] = resource_counts.get(rtype, 0) + 1
-
-    ndjson_path = os.path.join(FHIR_DIR, "fhir_bundles.ndjson")
-    with open(ndjson_path, "w") as f:
-        for b in bundles:
-            f.write(json.dumps(b, default=str) + "\n")
-
-    for tier in QUALITY_TIERS:
-        tier_bundles = [b for b in bundles if b["meta"]["tag"][0]["code"] == tier]
-        tier_path = os.path.join(FHIR_DIR, f"fhir_{tier}.ndjson")
-        with open(tier_path, "w") as f:
-            for b in tier_bundles:
-                f.write(json.dumps(b, default=str) + "\n")
-
-    sample_path = os.path.join(FHIR_DIR, "sample_bundle.json")
-    with open(sample_path, "w") as f:
-        json.dump(bundles[0], f, indent=2, default=str)
-
-    print(f"\n=== FHIR R4 OUTPUT ===")
-    print(f"  Total bundles:  {len(bundles)}")
-    print(f"  Quality tiers:  {dict(tier_counts)}")
-    print(f"  Resources:      {dict(resource_counts)}")
-    print(f"  NDJSON:         {ndjson_path}")
-    print(f"  Sample:         {sample_path}")
-    print(f"  Tier files:     {FHIR_DIR}/fhir_*.ndjson")
+        writer.add(pairs[pair_idx], tier)
+    writer.close()
+    print_summary(writer)
 
 
 if __name__ == "__main__":
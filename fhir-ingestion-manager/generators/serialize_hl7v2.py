@@ -1,8 +1,9 @@
-import json
 import os
 import random
 from datetime import datetime
 
+from population_store import load_base_population
+
 random.seed(42)
 
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "output")
@@ -183,11 +184,53 @@ def serialize_pair_to_hl7(pair, tier):
     return messages
 
 
-def main():
-    with open(BASE_POP_PATH) as f:
-        pairs = json.load(f)
+class Hl7Writer:
+    """Messages written as pairs arrive, to the combined file and the pair's tier file.
+    The first message is also written as the sample."""
+
+    def __init__(self, directory=HL7_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.all_path = os.path.join(directory, "hl7v2_messages.txt")
+        self.sample_path = os.path.join(directory, "sample_message.txt")
+        self._all = open(self.all_path, "w")
+        self._tiers = {tier: open(os.path.join(directory, f"hl7v2_{tier}.txt"), "w") for tier in HL7V2_TIERS}
+        self.pairs = 0
+        self.messages = 0
+        self.tier_counts = {t: 0 for t in HL7V2_TIERS}
+
+    def add(self, pair, tier):
+        messages = serialize_pair_to_hl7(pair, tier)
+        if not self.messages:
+            with open(self.sample_path, "w") as f:
+                f.write(messages[0].replace("\r", "\n"))
+        for msg in messages:
+            framed = msg + "\n\x1c\r\n"
+            self._all.write(framed)
+            self._tiers[tier].write(framed)
+        self.pairs += 1
+        self.messages += len(messages)
+        self.tier_counts[tier] += 1
+
+    def close(self):
+        self._all.close()
+        for f in self._tiers.values():
+            f.close()
+
+
+def print_summary(writer):
+    print(f"\n=== HL7v2 OUTPUT ===")
+    print(f"  Total pairs:    {writer.pairs}")
+    print(f"  Total messages: {writer.messages} (2 per pair: infant ADT + mother ADT)")
+    print(f"  Quality tiers:  {dict(writer.tier_counts)}")
+    print(f"  All messages:   {writer.all_path}")
+    print(f"  Sample:         {writer.sample_path}")
+    print(f"  Tier files:     {HL7_DIR}/hl7v2_*.txt")
+
 
-    os.makedirs(HL7_DIR, exist_ok=True)
+def main():
+    # Pairs are written in shuffled tier order, which needs the whole population in
+    # memory. `pipeline.py` streams instead, drawing each pair's tier as it goes.
+    pairs = load_base_population(BASE_POP_PATH)
 
     tier_assignments = []
     idx = 0
@@ -198,38 +241,11 @@ def main():
                 idx += 1
     random.shuffle(tier_assignments)
 
-    all_messages = []
-    tier_counts = {t: 0 for t in HL7V2_TIERS}
-
+    writer = Hl7Writer()
     for pair_idx, tier in tier_assignments:
-        messages = serialize_pair_to_hl7(pairs[pair_idx], tier)
-        for msg in messages:
-            all_messages.append((msg, tier))
-        tier_counts[tier] += 1
-
-    all_path = os.path.join(HL7_DIR, "hl7v2_messages.txt")
-    with open(all_path, "w") as f:
-        for msg, _ in all_messages:
-            f.write(msg + "\n\x1c\r\n")
-
-    for tier in HL7V2_TIERS:
-        tier_msgs = [m for m, t in all_messages if t == tier]
-        tier_path = os.path.join(HL7_DIR, f"hl7v2_{tier}.txt")
-        with open(tier_path, "w") as f:
-            for msg in tier_msgs:
-                f.write(msg + "\n\x1c\r\n")
-
-    sample_path = os.path.join(HL7_DIR, "sample_message.txt")
-    with open(sample_path, "w") as f:
-        f.write(all_messages[0][0].replace("\r", "\n"))
-
-    print(f"\n=== HL7v2 OUTPUT ===")
-    print(f"  Total pairs:    {len(tier_assignments)}")
-    print(f"  Total messages: {len(all_messages)} (2 per pair: infant ADT + mother ADT)")
-    print(f"  Quality tiers:  {dict(tier_counts)}")
-    print(f"  All messages:   {all_path}")
-    print(f"  Sample:         {sample_path}")
-    print(f"  Tier files:     {HL7_DIR}/hl7v2_*.txt")
+        writer.add(pairs[pair_idx], tier)
+    writer.close()
+    print_summary(writer)
 
 
 if __name__ == "__main__":